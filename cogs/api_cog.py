@@ -1,11 +1,18 @@
 import discord
 from discord.ext import commands
 import sqlite3
-from flask import Flask, jsonify, send_from_directory
+import asyncio
+from flask import Flask, jsonify, send_from_directory, request
+import hashlib
+import hmac
+import json
 import logging
 import os
 import subprocess
 import sys
+import threading
+import time
+from storage import create_storage
 
 # Set up Flask app logging
 log = logging.getLogger('werkzeug')
@@ -18,6 +25,19 @@ db_path = os.path.join(project_root, 'wom_multi.db')
 
 app = Flask(__name__, static_folder=website_dir, static_url_path='/')
 
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# Group summaries are cached per worker process for a short time and served with ETags
+GROUP_CACHE_TTL = 30
+GROUP_PAGE_MAX = 100
+group_response_cache = {} # cache key -> (expires_at, body, etag)
+
+# group_summaries holds one precomputed row per (group, guild), written by each guild's sync. Rows are
+# served as they are, one per guild, since links and changes belong to each guild's own sync.
+GROUP_SUMMARY_COLUMNS = ('group_id', 'guild_id', 'last_sync', 'member_count', 'linked_count', 'unresolved_count',
+                         'role_changes', 'name_changes', 'nickname_changes', 'last_change_at')
+GROUP_SUMMARY_SELECT = f"SELECT {', '.join(GROUP_SUMMARY_COLUMNS)} FROM group_summaries"
+
 # --- API Endpoints ---
 def get_count_safely(query):
     try:
@@ -31,26 +51,39 @@ def get_count_safely(query):
         print(f"Database error in get_count_safely: {e}")
         return 0
         
+# Each gunicorn worker opens the storage backend once, on its own event loop, and reuses it for every request
+storage_lock = threading.Lock()
+storage_loop = None
+api_storage = None
+
+def read_storage_stats():
+    """Returns (server_count, user_count, last_global_sync) from the bot's storage backend, which may not be wom_multi.db."""
+    global storage_loop, api_storage
+    async def read():
+        return await api_storage.get_stat('server_count'), await api_storage.total_links(), await api_storage.get_stat('last_global_sync')
+    try:
+        with storage_lock:
+            if api_storage is None:
+                storage_loop = storage_loop or asyncio.new_event_loop()
+                api_storage = storage_loop.run_until_complete(create_storage())
+            return storage_loop.run_until_complete(read())
+    except Exception as e:
+        print(f"Storage error in read_storage_stats: {e}")
+        return None, 0, None
+
 @app.route('/api/stats')
 def get_stats():
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-
-    c.execute("SELECT value FROM bot_stats WHERE key = 'server_count'")
-    server_count_raw = c.fetchone()
-    server_count = int(server_count_raw[0]) if server_count_raw and server_count_raw[0] is not None else 0
+    server_count_raw, user_count, last_global_sync_raw = read_storage_stats()
+    server_count = int(server_count_raw) if server_count_raw is not None else 0
+    last_global_sync_time = last_global_sync_raw if last_global_sync_raw is not None else "Never"
 
     group_count = get_count_safely("SELECT COUNT(DISTINCT group_id) FROM guild_configs WHERE group_id IS NOT NULL")
-    user_count = get_count_safely("SELECT COUNT(discord_id) FROM links")
 
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
     c.execute("SELECT MAX(last_sync) FROM guild_configs")
     last_sync_raw = c.fetchone()
     last_sync_time = last_sync_raw[0] if last_sync_raw and last_sync_raw[0] is not None else "Never"
-
-    c.execute("SELECT value FROM bot_stats WHERE key = 'last_global_sync'")
-    last_global_sync_raw = c.fetchone()
-    last_global_sync_time = last_global_sync_raw[0] if last_global_sync_raw and last_global_sync_raw[0] is not None else "Never"
-
     conn.close()
 
     stats = {
@@ -62,6 +95,118 @@ def get_stats():
     }
     return jsonify(stats)
 
+def summary_to_dict(row):
+    summary = dict(zip(GROUP_SUMMARY_COLUMNS, row))
+    del summary['group_id']
+    summary['guild_id'] = str(summary['guild_id']) # Snowflakes don't fit in a JavaScript number
+    summary['last_sync_changes'] = {
+        'roles': summary.pop('role_changes') or 0,
+        'rsns': summary.pop('name_changes') or 0,
+        'nicknames': summary.pop('nickname_changes') or 0,
+    }
+    return summary
+
+def cached_json_response(cache_key, build_body):
+    """Serves build_body()'s result from a short TTL cache, answering If-None-Match with 304."""
+    now = time.time()
+    cached = group_response_cache.get(cache_key)
+    if cached and cached[0] > now:
+        _, body, etag = cached
+    else:
+        try:
+            result = build_body()
+        except sqlite3.Error as e:
+            print(f"Database error in cached_json_response: {e}")
+            return jsonify({"error": "Database unavailable."}), 503
+        if result is None:
+            return jsonify({"error": "Not found."}), 404
+        body = json.dumps(result, separators=(',', ':'))
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        group_response_cache[cache_key] = (now + GROUP_CACHE_TTL, body, etag)
+        # Keep the cache from growing without bound on a busy worker
+        if len(group_response_cache) > 1000:
+            for key in [k for k, v in group_response_cache.items() if v[0] <= now]:
+                del group_response_cache[key]
+
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={GROUP_CACHE_TTL}"
+    return response
+
+@app.route('/api/groups/<int:group_id>')
+def get_group(group_id):
+    def build():
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute(f"{GROUP_SUMMARY_SELECT} WHERE group_id = ? ORDER BY guild_id", (group_id,))
+        rows = c.fetchall()
+        conn.close()
+        return {"group_id": group_id, "guilds": [summary_to_dict(row) for row in rows]} if rows else None
+    return cached_json_response(('group', group_id), build)
+
+@app.route('/api/groups')
+def list_groups():
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), GROUP_PAGE_MAX))
+
+    def build():
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        # Both reads walk the (group_id, guild_id) primary key
+        c.execute("SELECT DISTINCT group_id FROM group_summaries WHERE group_id > ? ORDER BY group_id LIMIT ?", (cursor, limit + 1))
+        group_ids = [row[0] for row in c.fetchall()]
+        has_more = len(group_ids) > limit
+        group_ids = group_ids[:limit]
+        groups = {group_id: [] for group_id in group_ids}
+        if group_ids:
+            c.execute(f"{GROUP_SUMMARY_SELECT} WHERE group_id BETWEEN ? AND ? ORDER BY group_id, guild_id", (group_ids[0], group_ids[-1]))
+            for row in c.fetchall():
+                groups[row[0]].append(summary_to_dict(row))
+        conn.close()
+        return {
+            "groups": [{"group_id": group_id, "guilds": guilds} for group_id, guilds in groups.items()],
+            "next_cursor": group_ids[-1] if has_more else None,
+        }
+    return cached_json_response(('groups', cursor, limit), build)
+
+@app.route('/api/webhooks/group-updated', methods=['POST'])
+def group_updated():
+    """
+    Queues a sync for every guild mapped to the posted group. Expects a JSON body with "groupId"
+    and an "Authorization: Bearer <WEBHOOK_SECRET>" header. The bot picks up queued groups shortly
+    after, so bursts of events for the same group collapse into one sync.
+    """
+    if not WEBHOOK_SECRET:
+        return jsonify({"error": "Webhooks are not enabled."}), 404
+
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(token.encode('utf-8'), WEBHOOK_SECRET.encode('utf-8')):
+        return jsonify({"error": "Unauthorized."}), 401
+
+    payload = request.get_json(silent=True) or {}
+    group_id = payload.get('groupId', payload.get('group_id'))
+    try:
+        group_id = int(group_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "A numeric groupId is required."}), 400
+
+    now = time.time()
+    try:
+        conn = sqlite3.connect(db_path)
+        c = conn.cursor()
+        c.execute("INSERT INTO pending_group_events (group_id, first_requested_at, last_requested_at) VALUES (?, ?, ?) "
+                  "ON CONFLICT (group_id) DO UPDATE SET last_requested_at = excluded.last_requested_at", (group_id, now, now))
+        conn.commit()
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"Database error in group_updated: {e}")
+        return jsonify({"error": "Could not queue the sync."}), 500
+
+    return jsonify({"queued": group_id}), 202
+
 @app.route('/')
 def serve_index():
     return send_from_directory(website_dir, 'index.html')
@@ -3,8 +3,14 @@ from discord import app_commands
 from discord.ext import commands
 import sqlite3
 import logging
-from main import sanitize_rsn, WOM_API_KEY
+import csv
+import io
+import json
+import re
+import time
+from main import sanitize_rsn, normalize_rsn, reminder_due_at, WOM_API_KEY, traced_command
 from typing import List
+from cogs.tasks_cog import SYNC_PRIORITY_INTERACTIVE, get_guild_group_ids, load_cached_group
 
 logger = logging.getLogger('WOMBot')
 
@@ -40,17 +46,132 @@ WOM_ROLES = {
     'zenyte'
 }
 
+MAX_BULK_FILE_SIZE = 1024 * 1024 # 1 MB is far more than a 500 member clan needs
+MENTION_PATTERN = re.compile(r'^<@!?(\d+)>$')
+
+def parse_bulk_links(text: str):
+    """
+    Parses "discord_id_or_mention, rsn" rows from a CSV or plain text attachment. Rows without a
+    comma, semicolon or tab are split at the first whitespace, as in "@user Zezima".
+    Returns a list of (line_number, discord_id, rsn) tuples and a list of invalid line descriptions.
+    """
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    rows = []
+    invalid = []
+    for line_number, fields in enumerate(csv.reader(io.StringIO(text), dialect), start=1):
+        fields = [f.strip() for f in fields if f.strip()]
+        if not fields:
+            continue
+        if len(fields) == 1:
+            fields = fields[0].split(None, 1)
+        if len(fields) < 2:
+            invalid.append(f"Line {line_number}: expected a user and an RSN")
+            continue
+
+        user_field, rsn = fields[0], sanitize_rsn(" ".join(fields[1:]))
+        mention = MENTION_PATTERN.match(user_field)
+        if mention:
+            discord_id = int(mention.group(1))
+        elif user_field.isdigit():
+            discord_id = int(user_field)
+        else:
+            # Allow a header row such as "discord_id,rsn"
+            if line_number != 1:
+                invalid.append(f"Line {line_number}: `{user_field[:32]}` is not a user ID or mention")
+            continue
+
+        if not rsn or len(rsn) > 12:
+            invalid.append(f"Line {line_number}: `{rsn[:32]}` is not a valid RSN")
+            continue
+        rows.append((line_number, discord_id, rsn))
+    return rows, invalid
+
+def build_autolink_proposals(members, memberships, linked_discord_ids, linked_wom_ids):
+    """
+    Matches unlinked guild members to unlinked WOM group members by name in linear time.
+    Returns a list of (member, wom_id, username, confidence) tuples, where confidence is
+    'exact' when a member name equals the WOM username ignoring case, and 'normalized'
+    when they only match after sanitize_rsn normalization. Ambiguous names are skipped.
+    """
+    players_by_key = {}
+    for player_id, username, _ in memberships:
+        if player_id in linked_wom_ids:
+            continue
+        key = normalize_rsn(username)
+        # None marks a key shared by several players, so it can never be matched
+        players_by_key[key] = None if key in players_by_key else (player_id, username)
+
+    candidates = {}
+    for member in members:
+        if member.bot or member.id in linked_discord_ids:
+            continue
+        matches = {}
+        for name in {member.nick, member.global_name, member.name} - {None}:
+            player = players_by_key.get(normalize_rsn(name))
+            if not player:
+                continue
+            confidence = 'exact' if name.casefold() == player[1].casefold() else 'normalized'
+            if matches.get(player[0]) != 'exact':
+                matches[player[0]] = confidence
+        # Names pointing at several different players are ambiguous
+        if len(matches) == 1:
+            wom_id, confidence = next(iter(matches.items()))
+            candidates.setdefault(wom_id, []).append((member, confidence))
+
+    proposals = []
+    for player_id, username, _ in memberships:
+        matched = candidates.get(player_id)
+        if matched and len(matched) == 1:
+            member, confidence = matched[0]
+            proposals.append((member, player_id, username, confidence))
+    return proposals
+
+class AutoLinkConfirmationView(discord.ui.View):
+    def __init__(self, author, guild_id, proposals):
+        super().__init__(timeout=180)
+        self.author = author
+        self.guild_id = guild_id
+        self.proposals = proposals
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.author.id
+
+    async def link(self, interaction: discord.Interaction, proposals):
+        linked = await interaction.client.storage.save_links(
+            self.guild_id, [(member.id, sanitize_rsn(username), wom_id) for member, wom_id, username, _ in proposals], replace=False)
+
+        self.stop()
+        for item in self.children:
+            item.disabled = True
+        logger.info("Auto-linked %s users in guild %s by user %s", linked, self.guild_id, interaction.user.id)
+        await interaction.response.edit_message(content=f"✅ Linked **{linked}** members.", view=self)
+
+    @discord.ui.button(label="Link Exact Matches", style=discord.ButtonStyle.green)
+    async def link_exact(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.link(interaction, [p for p in self.proposals if p[3] == 'exact'])
+
+    @discord.ui.button(label="Link All", style=discord.ButtonStyle.blurple)
+    async def link_all(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.link(interaction, self.proposals)
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.red)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.stop()
+        for item in self.children:
+            item.disabled = True
+        await interaction.response.edit_message(content="❌ Auto-link cancelled.", view=self)
+
 class ConfigCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
     async def role_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
-        conn = sqlite3.connect('wom_multi.db')
-        c = conn.cursor()
-        c.execute("SELECT wom_role FROM role_mappings WHERE guild_id = ?", (interaction.guild_id,))
-        mapped_roles = [row[0] for row in c.fetchall()]
-        conn.close()
-        
+        mapped_roles = await self.bot.storage.get_role_mappings(interaction.guild_id)
+
         return [
             app_commands.Choice(name=role, value=role)
             for role in mapped_roles if current.lower() in role.lower()
@@ -59,6 +180,7 @@ class ConfigCog(commands.Cog):
     @app_commands.command(name="logchannel", description="Set a channel for the bot to log sync events.")
     @app_commands.describe(channel="The channel to send log messages in. Leave blank to disable.")
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def set_log_channel(self, interaction: discord.Interaction, channel: discord.TextChannel = None):
         """
         Configures a channel where the bot will post detailed logs after each sync.
@@ -91,14 +213,39 @@ class ConfigCog(commands.Cog):
         conn.commit()
         conn.close()
 
-        logger.info(f"Guild {interaction.guild.id} set log channel to {log_channel_id} by user {interaction.user.id}")
+        logger.info("Guild %s set log channel to %s by user %s", interaction.guild.id, log_channel_id, interaction.user.id)
         if log_channel_id:
             await interaction.response.send_message(f"✅ Sync events will now be logged in {channel.mention}.", ephemeral=True)
         else:
             await interaction.response.send_message(f"✅ Sync event logging has been disabled.", ephemeral=True)
 
+    @app_commands.command(name="logmode", description="Choose whether sync logs are sent immediately or as a digest.")
+    @app_commands.describe(mode="Send a log after every sync, or collect them into an hourly or daily digest.")
+    @app_commands.choices(
+        mode=[
+            app_commands.Choice(name="Immediate (Default)", value="immediate"),
+            app_commands.Choice(name="Hourly Digest", value="hourly"),
+            app_commands.Choice(name="Daily Digest", value="daily"),
+        ]
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def logmode(self, interaction: discord.Interaction, mode: app_commands.Choice[str]):
+        """Sets how sync log messages are delivered for the guild."""
+        guild_id = interaction.guild_id
+
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("UPDATE guild_configs SET log_mode = ? WHERE guild_id = ?", (mode.value, guild_id))
+        conn.commit()
+        conn.close()
+
+        logger.info("Guild %s set log mode to %s by user %s", guild_id, mode.value, interaction.user.id)
+        await interaction.response.send_message(f"✅ Sync log mode has been set to `{mode.name}`.", ephemeral=True)
+
     @app_commands.command(name="groupid", description="Set the WOM Group ID")
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def set_group_id(self, interaction: discord.Interaction, group_id: int):
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
@@ -107,9 +254,100 @@ class ConfigCog(commands.Cog):
         conn.close()
         await interaction.response.send_message(f"✅ Group ID set to **{group_id}**.", ephemeral=True)
 
+    @app_commands.command(name="addgroup", description="Add another WOM group to sync, e.g. an alt-account group")
+    @app_commands.describe(group_id="The additional WOM Group ID.",
+                           priority="Lower numbers win when a player is in several groups. Your main group is always 0.")
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def addgroup(self, interaction: discord.Interaction, group_id: int, priority: app_commands.Range[int, 1, 100] = None):
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+
+        c.execute("SELECT group_id FROM guild_configs WHERE guild_id = ?", (interaction.guild_id,))
+        config = c.fetchone()
+        if not config or config[0] is None:
+            conn.close()
+            await interaction.response.send_message("❌ Please set your server's main Wise Old Man Group ID first using `/groupid`.", ephemeral=True)
+            return
+        if config[0] == group_id:
+            conn.close()
+            await interaction.response.send_message(f"🤔 **{group_id}** is already this server's main group.", ephemeral=True)
+            return
+
+        if priority is None:
+            c.execute("SELECT COALESCE(MAX(priority), 0) + 1 FROM guild_groups WHERE guild_id = ?", (interaction.guild_id,))
+            priority = c.fetchone()[0]
+
+        c.execute("INSERT OR REPLACE INTO guild_groups (guild_id, group_id, priority) VALUES (?, ?, ?)", (interaction.guild_id, group_id, priority))
+        conn.commit()
+        conn.close()
+
+        logger.info("Guild %s added group %s with priority %s by user %s", interaction.guild_id, group_id, priority, interaction.user.id)
+        await interaction.response.send_message(f"✅ Group **{group_id}** will now be synced with priority **{priority}**.", ephemeral=True)
+
+    @app_commands.command(name="removegroup", description="Stop syncing an additional WOM group")
+    @app_commands.describe(group_id="The additional WOM Group ID to remove.")
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def removegroup(self, interaction: discord.Interaction, group_id: int):
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("DELETE FROM guild_groups WHERE guild_id = ? AND group_id = ?", (interaction.guild_id, group_id))
+        changes = conn.total_changes
+        conn.commit()
+        conn.close()
+
+        if changes > 0:
+            logger.info("Guild %s removed group %s by user %s", interaction.guild_id, group_id, interaction.user.id)
+            await interaction.response.send_message(f"✅ Group **{group_id}** will no longer be synced.", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"🤔 Group **{group_id}** is not an additional group for this server.", ephemeral=True)
+
+    @app_commands.command(name="syncnow", description="Sync this server's roles now instead of waiting for the hourly sync")
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def syncnow(self, interaction: discord.Interaction):
+        tasks_cog = self.bot.get_cog('TasksCog')
+        if not tasks_cog:
+            await interaction.response.send_message("❌ The sync engine is not loaded. Please try again later.", ephemeral=True)
+            return
+
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("SELECT group_id FROM guild_configs WHERE guild_id = ?", (interaction.guild_id,))
+        config = c.fetchone()
+        conn.close()
+        if not config or config[0] is None:
+            await interaction.response.send_message("❌ Please set your server's Wise Old Man Group ID first using `/groupid`.", ephemeral=True)
+            return
+
+        remaining = tasks_cog.syncnow_cooldown_remaining(interaction.guild_id)
+        if remaining > 0:
+            await interaction.response.send_message(f"⏳ This server was synced recently. Please try again in **{int(remaining // 60) + 1}** minutes.", ephemeral=True)
+            return
+        # Hold the slot while the sync runs so repeated requests don't pile up; only a successful sync starts the cooldown
+        tasks_cog.last_interactive_sync[interaction.guild_id] = time.monotonic()
+        result = None
+        try:
+            await interaction.response.defer(ephemeral=True)
+            result = await tasks_cog.enqueue_sync(interaction.guild_id, SYNC_PRIORITY_INTERACTIVE)
+        finally:
+            if result:
+                tasks_cog.last_interactive_sync[interaction.guild_id] = time.monotonic()
+            else:
+                tasks_cog.last_interactive_sync.pop(interaction.guild_id, None)
+        if not result:
+            await interaction.followup.send("⚠️ The sync could not be completed. Check your log channel for details or try again later.", ephemeral=True)
+            return
+
+        synced, failed, checked = result
+        logger.info("Guild %s ran /syncnow by user %s: %s checked, %s updated, %s failed", interaction.guild_id, interaction.user.id, checked, synced, failed)
+        await interaction.followup.send(f"✅ Sync finished.\nChecked: `{checked}`\nUpdated: `{synced}`\nFailed: `{failed}`", ephemeral=True)
+
     @app_commands.command(name="linkrole", description="Map a WOM Group Role to a Discord Role")
     @app_commands.describe(wom_role="The role name on Wise Old Man.", discord_role="The Discord role to assign")
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def linkrole(self, interaction: discord.Interaction, wom_role: str, discord_role: discord.Role):
         # Validate the role against the official list
         if wom_role.lower() not in WOM_ROLES:
@@ -126,31 +364,75 @@ class ConfigCog(commands.Cog):
             await interaction.response.send_message("❌ Please set your server's Wise Old Man Group ID first using `/groupid`.", ephemeral=True)
             return
 
-        c.execute("INSERT OR REPLACE INTO role_mappings (guild_id, wom_role, discord_role_id) VALUES (?, ?, ?)",
-                  (interaction.guild_id, wom_role.lower(), discord_role.id))
-        conn.commit()
         conn.close()
+
+        await self.bot.storage.set_role_mapping(interaction.guild_id, wom_role.lower(), discord_role.id)
         await interaction.response.send_message(f"✅ Mapped WOM rank **{wom_role.lower()}** to Discord role {discord_role.mention}.", ephemeral=True)
 
     @app_commands.command(name="unlinkrole", description="Remove a role mapping")
     @app_commands.describe(wom_role="The WOM role mapping to remove")
     @app_commands.autocomplete(wom_role=role_autocomplete)
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def unlinkrole(self, interaction: discord.Interaction, wom_role: str):
+        if await self.bot.storage.delete_role_mapping(interaction.guild_id, wom_role):
+            await interaction.response.send_message(f"✅ The mapping for WOM role **{wom_role}** has been removed.", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"🤔 No mapping was found for the WOM role **{wom_role}**.", ephemeral=True)
+
+    @app_commands.command(name="linkthreshold", description="Give a Discord role to players who reach a stat threshold")
+    @app_commands.describe(metric="The stat to check", min_value="The minimum value needed for the role", discord_role="The Discord role to assign")
+    @app_commands.choices(
+        metric=[
+            app_commands.Choice(name="Total Level", value="total_level"),
+            app_commands.Choice(name="Overall Experience", value="exp"),
+            app_commands.Choice(name="EHP", value="ehp"),
+            app_commands.Choice(name="EHB", value="ehb"),
+        ]
+    )
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def linkthreshold(self, interaction: discord.Interaction, metric: app_commands.Choice[str], min_value: app_commands.Range[float, 0], discord_role: discord.Role):
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
-        c.execute("DELETE FROM role_mappings WHERE guild_id = ? AND wom_role = ?", (interaction.guild_id, wom_role))
+
+        c.execute("SELECT group_id FROM guild_configs WHERE guild_id = ?", (interaction.guild_id,))
+        config = c.fetchone()
+        if not config or config[0] is None:
+            conn.close()
+            await interaction.response.send_message("❌ Please set your server's Wise Old Man Group ID first using `/groupid`.", ephemeral=True)
+            return
+
+        c.execute("INSERT OR REPLACE INTO threshold_mappings (guild_id, metric, min_value, discord_role_id) VALUES (?, ?, ?, ?)",
+                  (interaction.guild_id, metric.value, min_value, discord_role.id))
+        # Player stats are only stored while a threshold exists, so make the next fetch of the guild's groups a full one
+        c.execute("UPDATE wom_group_cache SET etag = NULL, fetched_at = 0 WHERE group_id = ? OR group_id IN (SELECT group_id FROM guild_groups WHERE guild_id = ?)",
+                  (config[0], interaction.guild_id))
+        conn.commit()
+        conn.close()
+        await interaction.response.send_message(f"✅ Players with **{metric.name}** of at least **{min_value:g}** will get {discord_role.mention}. "
+                                                f"Only the highest {metric.name} role a player reaches is given.", ephemeral=True)
+
+    @app_commands.command(name="unlinkthreshold", description="Remove a stat threshold role")
+    @app_commands.describe(discord_role="The Discord role to stop assigning by stat threshold")
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def unlinkthreshold(self, interaction: discord.Interaction, discord_role: discord.Role):
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("DELETE FROM threshold_mappings WHERE guild_id = ? AND discord_role_id = ?", (interaction.guild_id, discord_role.id))
         changes = conn.total_changes
         conn.commit()
         conn.close()
 
         if changes > 0:
-            await interaction.response.send_message(f"✅ The mapping for WOM role **{wom_role}** has been removed.", ephemeral=True)
+            await interaction.response.send_message(f"✅ {discord_role.mention} is no longer assigned by stat threshold.", ephemeral=True)
         else:
-            await interaction.response.send_message(f"🤔 No mapping was found for the WOM role **{wom_role}**.", ephemeral=True)
+            await interaction.response.send_message(f"🤔 No stat threshold was found for {discord_role.mention}.", ephemeral=True)
 
     @app_commands.command(name="linkuser", description="Link or update an RSN for a user")
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def linkuser(self, interaction: discord.Interaction, user: discord.Member, rsn: str):
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
@@ -164,25 +446,149 @@ class ConfigCog(commands.Cog):
 
         clean_rsn = sanitize_rsn(rsn)
         
-        wom_id = None # Set wom_id to None, it will be populated during sync
+        # Resolve the WOM id from the shared player table, but only among the members of this guild's
+        # cached groups, so a player outside the groups is still reported as not found by the sync.
+        # Anything else, including an ambiguous name, is left for the next sync to resolve.
+        member_ids = set()
+        for group_id in get_guild_group_ids(interaction.guild_id, config[0]):
+            cached = load_cached_group(group_id)
+            if cached:
+                member_ids.update(player_id for player_id, _, _ in cached['memberships'])
+        c.execute("SELECT wom_id FROM players WHERE normalized_name = ? AND wom_id IN (SELECT value FROM json_each(?)) LIMIT 2",
+                  (normalize_rsn(clean_rsn), json.dumps(list(member_ids))))
+        players = c.fetchall()
+        wom_id = players[0][0] if len(players) == 1 else None
+        conn.close()
 
-        c.execute("INSERT OR REPLACE INTO links (guild_id, discord_id, rsn, wom_id) VALUES (?, ?, ?, ?)", (interaction.guild_id, user.id, clean_rsn, wom_id))
-        conn.commit()
+        await self.bot.storage.save_links(interaction.guild_id, [(user.id, clean_rsn, wom_id)])
+        if wom_id:
+            await interaction.response.send_message(f"✅ Linked {user.mention} to **{clean_rsn}**.", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"✅ Linked {user.mention} to **{clean_rsn}**. This RSN will be verified during the next sync.", ephemeral=True)
+
+    @app_commands.command(name="linkbulk", description="Link many users at once from a CSV or text file")
+    @app_commands.describe(file="A CSV or text file with one 'discord_id or @mention, RSN' pair per line.")
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def linkbulk(self, interaction: discord.Interaction, file: discord.Attachment):
+        if file.size > MAX_BULK_FILE_SIZE:
+            await interaction.response.send_message("❌ That file is too large. Please keep bulk link files under 1 MB.", ephemeral=True)
+            return
+
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("SELECT group_id FROM guild_configs WHERE guild_id = ?", (interaction.guild_id,))
+        config = c.fetchone()
         conn.close()
-        await interaction.response.send_message(f"✅ Linked {user.mention} to **{clean_rsn}**. This RSN will be verified during the next sync.", ephemeral=True)
+        if not config or config[0] is None:
+            await interaction.response.send_message("❌ Please set your server's Wise Old Man Group ID first using `/groupid`.", ephemeral=True)
+            return
+        group_id = config[0]
 
-    @app_commands.command(name="unlinkuser", description="Unlink a user from their RSN")
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            text = (await file.read()).decode('utf-8-sig')
+        except UnicodeDecodeError:
+            await interaction.followup.send("❌ Could not read that file. Please upload a UTF-8 CSV or text file.", ephemeral=True)
+            return
+
+        rows, invalid = parse_bulk_links(text)
+
+        # Resolve WOM ids now against a single fetch of the group instead of waiting for the next sync
+        wom_id_by_username = {}
+        tasks_cog = self.bot.get_cog('TasksCog')
+        if tasks_cog:
+            try:
+                memberships = await tasks_cog.fetch_guild_memberships(interaction.guild_id, group_id)
+                wom_id_by_username = {normalize_rsn(username): player_id for player_id, username, _ in memberships}
+            except Exception as e:
+                logger.warning("Could not fetch group %s for bulk link resolution in guild %s: %s", group_id, interaction.guild_id, e)
+
+        to_insert = {}
+        unresolved = []
+        for line_number, discord_id, rsn in rows:
+            member = interaction.guild.get_member(discord_id)
+            if not member:
+                invalid.append(f"Line {line_number}: user `{discord_id}` is not in this server")
+                continue
+            wom_id = wom_id_by_username.get(normalize_rsn(rsn))
+            if not wom_id:
+                unresolved.append(f"▫️ {member.mention} (RSN: `{rsn}`)")
+            to_insert[discord_id] = (discord_id, rsn, wom_id)
+
+        if to_insert:
+            await self.bot.storage.save_links(interaction.guild_id, list(to_insert.values()))
+
+        logger.info("Bulk linked %s users in guild %s by user %s (%s unresolved, %s invalid)", len(to_insert), interaction.guild_id, interaction.user.id, len(unresolved), len(invalid))
+
+        embed = discord.Embed(title="Bulk Link Summary", color=discord.Color.blue())
+        embed.add_field(name="✅ Linked", value=str(len(to_insert) - len(unresolved)), inline=True)
+        embed.add_field(name="❓ Unresolved", value=str(len(unresolved)), inline=True)
+        embed.add_field(name="❌ Invalid", value=str(len(invalid)), inline=True)
+        if unresolved:
+            embed.add_field(name="❓ RSN Not Found in WOM Group (will be retried on each sync)", value="\n".join(unresolved)[:1024], inline=False)
+        if invalid:
+            embed.add_field(name="❌ Invalid Rows", value="\n".join(invalid)[:1024], inline=False)
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="autolink", description="Suggest links by matching member nicknames to WOM group usernames")
     @app_commands.checks.has_permissions(administrator=True)
-    async def unlinkuser(self, interaction: discord.Interaction, user: discord.Member):
+    @traced_command
+    async def autolink(self, interaction: discord.Interaction):
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
-        c.execute("DELETE FROM links WHERE guild_id = ? AND discord_id = ?", (interaction.guild_id, user.id))
-        changes = conn.total_changes
-        conn.commit()
+        c.execute("SELECT group_id FROM guild_configs WHERE guild_id = ?", (interaction.guild_id,))
+        config = c.fetchone()
+        if not config or config[0] is None:
+            conn.close()
+            await interaction.response.send_message("❌ Please set your server's Wise Old Man Group ID first using `/groupid`.", ephemeral=True)
+            return
+        group_id = config[0]
         conn.close()
 
-        if changes > 0:
-            logger.info(f"User {user.id} was unlinked in guild {interaction.guild.id} by {interaction.user.id}")
+        links = await self.bot.storage.get_links(interaction.guild_id)
+
+        await interaction.response.defer(ephemeral=True)
+
+        tasks_cog = self.bot.get_cog('TasksCog')
+        if not tasks_cog:
+            await interaction.followup.send("❌ The sync engine is not loaded. Please try again later.", ephemeral=True)
+            return
+        try:
+            memberships = await tasks_cog.fetch_guild_memberships(interaction.guild_id, group_id)
+        except Exception as e:
+            logger.error("Could not fetch group %s for autolink in guild %s: %s", group_id, interaction.guild_id, e)
+            await interaction.followup.send("⚠️ Could not fetch your group from the Wise Old Man API. Please try again later.", ephemeral=True)
+            return
+
+        proposals = build_autolink_proposals(interaction.guild.members, memberships,
+                                             {row[0] for row in links}, {row[2] for row in links if row[2]})
+        if not proposals:
+            await interaction.followup.send("🤔 No unlinked members have a nickname matching an unlinked WOM group member.", ephemeral=True)
+            return
+
+        exact_count = sum(1 for p in proposals if p[3] == 'exact')
+        lines = [f"▫️ {member.mention} → `{username}`{'' if confidence == 'exact' else ' (normalized)'}" for member, _, username, confidence in proposals]
+        embed = discord.Embed(
+            title="Auto-link Suggestions",
+            description=f"Found **{len(proposals)}** matches ({exact_count} exact, {len(proposals) - exact_count} normalized).",
+            color=discord.Color.orange()
+        )
+        proposed_text = "\n".join(lines)
+        embed.add_field(name="Proposed Links", value=proposed_text[:1024], inline=False)
+        if len(proposed_text) > 1024:
+            embed.set_footer(text="Only the first matches are shown above. All of them will be linked on confirmation.")
+
+        view = AutoLinkConfirmationView(interaction.user, interaction.guild_id, proposals)
+        await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+
+    @app_commands.command(name="unlinkuser", description="Unlink a user from their RSN")
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def unlinkuser(self, interaction: discord.Interaction, user: discord.Member):
+        if await self.bot.storage.delete_link(interaction.guild_id, user.id):
+            logger.info("User %s was unlinked in guild %s by %s", user.id, interaction.guild.id, interaction.user.id)
             await interaction.response.send_message(f"✅ {user.mention} has been unlinked.", ephemeral=True)
         else:
             await interaction.response.send_message(f"🤔 {user.mention} was not linked to an RSN in this server.", ephemeral=True)
@@ -196,6 +602,7 @@ class ConfigCog(commands.Cog):
         ]
     )
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def nickname(self, interaction: discord.Interaction, state: app_commands.Choice[str]):
         """Toggles nickname enforcement on or off."""
         guild_id = interaction.guild_id
@@ -207,7 +614,7 @@ class ConfigCog(commands.Cog):
         conn.commit()
         conn.close()
 
-        logger.info(f"Guild {guild_id} set nickname enforcement to {state.name} by user {interaction.user.id}")
+        logger.info("Guild %s set nickname enforcement to %s by user %s", guild_id, state.name, interaction.user.id)
         await interaction.response.send_message(f"✅ Nickname enforcement has been set to `{state.name}`.", ephemeral=True)
 
     @app_commands.command(name="reminder", description="Set the inactivity reminder for the sync log channel.")
@@ -223,6 +630,7 @@ class ConfigCog(commands.Cog):
         ]
     )
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def reminder(self, interaction: discord.Interaction, interval: app_commands.Choice[str]):
         """Sets the reminder interval for the guild."""
         guild_id = interaction.guild_id
@@ -239,11 +647,19 @@ class ConfigCog(commands.Cog):
 
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
-        c.execute("UPDATE guild_configs SET reminder_interval_days = ? WHERE guild_id = ?", (reminder_days, guild_id))
+        # Reschedule from the last recorded change, or from now if there is none
+        c.execute("SELECT last_change_timestamp FROM guild_configs WHERE guild_id = ?", (guild_id,))
+        row = c.fetchone()
+        next_reminder_at = reminder_due_at(row[0] if row else None, reminder_days) if reminder_days > 0 else None
+        c.execute("UPDATE guild_configs SET reminder_interval_days = ?, next_reminder_at = ? WHERE guild_id = ?", (reminder_days, next_reminder_at, guild_id))
         conn.commit()
         conn.close()
 
-        logger.info(f"Guild {guild_id} set reminder interval to {interval.name} by user {interaction.user.id}")
+        tasks_cog = self.bot.get_cog('TasksCog')
+        if tasks_cog:
+            tasks_cog.reminder_wakeup.set()
+
+        logger.info("Guild %s set reminder interval to %s by user %s", guild_id, interval.name, interaction.user.id)
         if reminder_days == 0:
             await interaction.response.send_message("✅ Inactivity reminders have been disabled.", ephemeral=True)
         else:
@@ -258,6 +674,7 @@ class ConfigCog(commands.Cog):
         ]
     )
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def notifyplayers(self, interaction: discord.Interaction, state: app_commands.Choice[str]):
         """Toggles role change DM notifications for the guild."""
         guild_id = interaction.guild_id
@@ -269,7 +686,7 @@ class ConfigCog(commands.Cog):
         conn.commit()
         conn.close()
 
-        logger.info(f"Guild {guild_id} set player DM notifications to {state.name} by user {interaction.user.id}")
+        logger.info("Guild %s set player DM notifications to %s by user %s", guild_id, state.name, interaction.user.id)
         if new_state == 1:
             await interaction.response.send_message("✅ Players will now be notified via DM when their roles change.", ephemeral=True)
         else:
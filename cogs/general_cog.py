@@ -3,33 +3,56 @@ from discord import app_commands
 from discord.ext import commands
 import sqlite3
 import datetime
-from typing import List
+import csv
+import io
+import tempfile
+from main import traced_command
+
+async def export_links_csv(storage, guild_id: int, **filters) -> discord.File:
+    """Streams the guild's (filtered) links into a temporary CSV file without loading them all into memory."""
+    tmp = tempfile.TemporaryFile()
+    writer_stream = io.TextIOWrapper(tmp, encoding='utf-8', newline='')
+    writer = csv.writer(writer_stream)
+    writer.writerow(["discord_id", "rsn", "wom_id", "wom_role"])
+
+    async for rows in storage.iter_links(guild_id, **filters):
+        writer.writerows(rows)
+
+    writer_stream.flush()
+    writer_stream.detach()
+    tmp.seek(0)
+    return discord.File(tmp, filename=f"linked_players_{guild_id}.csv")
 
 class PlayerListView(discord.ui.View):
-    def __init__(self, interaction: discord.Interaction, links: List[tuple], guild_name: str, group_id: int):
+    def __init__(self, interaction: discord.Interaction, guild_name: str, group_id: int, total: int, **filters):
         super().__init__(timeout=180)
         self.interaction = interaction
-        self.links = links
         self.guild_name = guild_name
         self.group_id = group_id
+        self.total = total
+        self.filters = filters
         self.current_page = 0
         self.items_per_page = 10
+        # Keyset cursors: page_keys[n] is the (rsn, discord_id) key that page n starts after
+        self.page_keys = [None]
+        self.page_links = []
+
+    async def load_page(self):
+        self.page_links = await self.interaction.client.storage.fetch_links_page(
+            self.interaction.guild_id, after=self.page_keys[self.current_page], limit=self.items_per_page, **self.filters)
+        if self.page_links and len(self.page_keys) == self.current_page + 1:
+            last_id, last_rsn = self.page_links[-1]
+            self.page_keys.append((last_rsn, last_id))
 
     async def get_embed(self) -> discord.Embed:
-        start_index = self.current_page * self.items_per_page
-        end_index = start_index + self.items_per_page
-        page_links = self.links[start_index:end_index]
+        await self.load_page()
 
         embed = discord.Embed(
             title=f"Linked Players for {self.guild_name} (Group {self.group_id})",
             color=discord.Color.blue()
         )
 
-        description = ""
-        for discord_id, rsn in page_links:
-            user = self.interaction.guild.get_member(discord_id)
-            user_name = str(user) if user else "Unknown User"
-            description += f"• {user_name} ({discord_id}) - **{rsn}**\n"
+        description = "".join(f"• <@{discord_id}> ({discord_id}) - **{rsn}**\n" for discord_id, rsn in self.page_links)
         
         if not description:
             description = "No linked players on this page."
@@ -39,7 +62,7 @@ class PlayerListView(discord.ui.View):
         return embed
 
     def get_max_pages(self) -> int:
-        return (len(self.links) + self.items_per_page - 1) // self.items_per_page
+        return max(1, (self.total + self.items_per_page - 1) // self.items_per_page)
 
     async def update_message(self, interaction: discord.Interaction):
         embed = await self.get_embed()
@@ -49,7 +72,7 @@ class PlayerListView(discord.ui.View):
     def update_buttons(self):
         max_pages = self.get_max_pages()
         self.children[0].disabled = self.current_page == 0
-        self.children[1].disabled = self.current_page == max_pages - 1
+        self.children[1].disabled = self.current_page >= max_pages - 1
 
     @discord.ui.button(label="Previous", style=discord.ButtonStyle.grey)
     async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -83,16 +106,14 @@ class InfoView(discord.ui.View):
             return
 
         group_id = config[0]
-        
-        c.execute("SELECT discord_id, rsn FROM links WHERE guild_id = ?", (interaction.guild_id,))
-        links = c.fetchall()
         conn.close()
 
-        if not links:
+        total = await interaction.client.storage.count_links(interaction.guild_id)
+        if not total:
             await interaction.followup.send("No players have been linked in this server yet. Use `/linkuser` to add one.", ephemeral=True)
             return
 
-        view = PlayerListView(interaction, links, interaction.guild.name, group_id)
+        view = PlayerListView(interaction, interaction.guild.name, group_id, total)
         embed = await view.get_embed()
         view.update_buttons()
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
@@ -103,23 +124,32 @@ class GeneralCog(commands.Cog):
         self.bot = bot
 
     @app_commands.command(name="help", description="How to set up the bot")
+    @traced_command
     async def help_cmd(self, interaction: discord.Interaction):
         embed = discord.Embed(title="Setup Guide", color=discord.Color.green())
         embed.add_field(name="1. Wise Old Man Setup", value="Your clan must use the **[WOM Runelite Plugin](https://runelite.net/plugin-hub/show/wom-utils)**. After configuring the plugin, open the Clan Chat tab in-game and click \"Sync WOM Group\" to ensure ranks are up to date on the website.", inline=False)
         embed.add_field(name="2. Find Group ID", value="Go to your group page on https://wiseoldman.net/. The ID is the numbers at the end of the URL (e.g., `.../groups/1234`; your Group ID would be 1234).", inline=False)
         embed.add_field(name="3. Organise Roles", value="Ensure that this bot's role is above the Discord roles you wish to assign.", inline=False)
         embed.add_field(name="4. Commands", value="`/groupid [id]` - Set your clan ID\n"
+                                                  "`/addgroup [id]` / `/removegroup [id]` - Sync additional groups\n"
+                                                  "`/syncnow` - Sync this server's roles now\n"
                                                   "`/logchannel #channel` - Set a channel to log role changes\n"
+                                                  "`/logmode immediate/hourly/daily` - Send logs after each sync or as a digest\n"
                                                   "`/linkuser @user [rsn]` - Link/Update a member\n"
+                                                  "`/linkbulk [file]` - Link many members from a CSV file\n"
+                                                  "`/autolink` - Suggest links from member nicknames\n"
                                                   "`/unlinkuser @user` - Unlink a member\n"
                                                   "`/linkrole [wom_role] [discord_role]` - Map WOM Group Role to Discord Role\n"
                                                   "`/unlinkrole [wom_role]` - Remove a role mapping\n"
+                                                  "`/linkthreshold [metric] [min_value] [discord_role]` - Give a role at a stat threshold\n"
+                                                  "`/unlinkthreshold [discord_role]` - Remove a stat threshold role\n"
                                                   "`/nickname on/off` - Toggle forcing member nicknames to their RSN\n"
                                                   "`/reminder off/3d/..` - Set inactivity reminder timer\n"
                                                   "`/notifyplayers on/off` - Toggle role change DMs for all players\n"
                                                   "`/notifyme on/off` - Toggle personal role change DMs\n"
-                                                  "`/playerlist` - View linked players\n"
+                                                  "`/playerlist [rsn_prefix] [unresolved] [wom_role] [export]` - View or export linked players\n"
                                                   "`/checkuser @user` - Check a user's linked RSN\n"
+                                                  "`/history @user` - View a user's recent role and name changes\n"
                                                   "`/info` - View configuration and sync status", inline=False)
         embed.add_field(name="Need further help?", value="[Join the support Discord](https://discord.gg/T6j59QC2kh)\n[List of WOM Group Roles](https://docs.wiseoldman.net/api/groups/group-type-definitions#object-membership)", inline=False)
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -127,31 +157,57 @@ class GeneralCog(commands.Cog):
     @app_commands.command(name="checkuser", description="Check the RSN linked to a Discord user")
     @app_commands.describe(user="The user to check")
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def checkuser(self, interaction: discord.Interaction, user: discord.Member):
+        link = await self.bot.storage.get_link(interaction.guild_id, user.id)
+
+        if link:
+            await interaction.response.send_message(f"✅ {user.mention} is linked to the RSN: **{link[1]}**", ephemeral=True)
+        else:
+            await interaction.response.send_message(f"🤔 {user.mention} is not linked to any RSN in this server.", ephemeral=True)
+
+    @app_commands.command(name="history", description="View a user's recent role, RSN and nickname changes")
+    @app_commands.describe(user="The user to check")
+    @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
+    async def history(self, interaction: discord.Interaction, user: discord.Member):
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
-        c.execute("SELECT rsn FROM links WHERE guild_id = ? AND discord_id = ?", (interaction.guild_id, user.id))
-        result = c.fetchone()
+        c.execute("SELECT event_type, old_value, new_value, created_at FROM role_events WHERE guild_id = ? AND discord_id = ? ORDER BY created_at DESC, id DESC LIMIT 15",
+                  (interaction.guild_id, user.id))
+        events = c.fetchall()
         conn.close()
 
-        if result:
-            await interaction.response.send_message(f"✅ {user.mention} is linked to the RSN: **{result[0]}**", ephemeral=True)
-        else:
-            await interaction.response.send_message(f"🤔 {user.mention} is not linked to any RSN in this server.", ephemeral=True)
+        if not events:
+            await interaction.response.send_message(f"🤔 No recorded changes for {user.mention} in this server.", ephemeral=True)
+            return
+
+        labels = {'role': "👥 Role", 'rename': "✍️ RSN", 'nickname': "✍️ Nickname"}
+        lines = [f"<t:{created_at}:d> {labels.get(event_type, event_type)}: `{old_value or '(none)'}` → `{new_value or '(none)'}`"
+                 for event_type, old_value, new_value, created_at in events]
+
+        embed = discord.Embed(title=f"Change History for {user.display_name}", description="\n".join(lines)[:4096], color=discord.Color.blue())
+        embed.set_footer(text="Showing the 15 most recent changes.")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
     @app_commands.command(name="info", description="View configuration and sync status")
     @app_commands.checks.has_permissions(administrator=True)
+    @traced_command
     async def info(self, interaction: discord.Interaction):
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
         c.execute("SELECT group_id, last_sync FROM guild_configs WHERE guild_id = ?", (interaction.guild_id,))
         config = c.fetchone()
 
-        c.execute("SELECT wom_role, discord_role_id FROM role_mappings WHERE guild_id = ?", (interaction.guild_id,))
-        mappings = c.fetchall()
+        c.execute("SELECT group_id, priority FROM guild_groups WHERE guild_id = ? ORDER BY priority, group_id", (interaction.guild_id,))
+        extra_groups = c.fetchall()
         conn.close()
 
+        mappings = await self.bot.storage.get_role_mappings(interaction.guild_id)
+
         gid = config[0] if config else "None"
+        if extra_groups:
+            gid = f"{gid}\n" + "\n".join(f"+ {group_id} (priority {priority})" for group_id, priority in extra_groups)
         
         if config and config[1]:
             try:
@@ -162,7 +218,7 @@ class GeneralCog(commands.Cog):
         else:
             lsync = "Never"
 
-        mapping_text = "\n".join([f"• {w}: <@&{r}>" for w, r in mappings]) if mappings else "No roles mapped yet."
+        mapping_text = "\n".join([f"• {w}: <@&{r}>" for w, r in mappings.items()]) if mappings else "No roles mapped yet."
 
         embed = discord.Embed(title="Server Sync Status", color=discord.Color.blue())
         embed.add_field(name="Group ID", value=gid, inline=True)
@@ -180,26 +236,18 @@ class GeneralCog(commands.Cog):
             app_commands.Choice(name="off", value="off"),
         ]
     )
+    @traced_command
     async def notifyme(self, interaction: discord.Interaction, state: app_commands.Choice[str]):
         """Toggles personal role change DM notifications for the user."""
         guild_id = interaction.guild_id
         user_id = interaction.user.id
         new_state = 1 if state.value == "on" else 0
 
-        conn = sqlite3.connect('wom_multi.db')
-        c = conn.cursor()
-
-        # Check if user is linked
-        c.execute("SELECT 1 FROM links WHERE guild_id = ? AND discord_id = ?", (guild_id, user_id))
-        if c.fetchone() is None:
-            conn.close()
+        # Only linked users have a notification preference to change
+        if not await self.bot.storage.set_link_notifications(guild_id, user_id, new_state == 1):
             await interaction.response.send_message("You are not linked to an RSN in this server. An admin must link you with `/linkuser` first.", ephemeral=True)
             return
 
-        c.execute("UPDATE links SET dm_notifications_on = ? WHERE guild_id = ? AND discord_id = ?", (new_state, guild_id, user_id))
-        conn.commit()
-        conn.close()
-
         if new_state == 1:
             await interaction.response.send_message("✅ You will now receive DMs when your roles change in this server.", ephemeral=True)
         else:
@@ -4,11 +4,35 @@ from discord.ext import commands
 import sqlite3
 import logging
 from typing import Optional
-from cogs.general_cog import PlayerListView
+from cogs.general_cog import PlayerListView, export_links_csv
+from cogs.tasks_cog import SYNC_PRIORITY_INTERACTIVE
 import asyncio
+import datetime
+import gc
+import io
+import tracemalloc
+from collections import Counter
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
 
 logger = logging.getLogger('WOMBot')
 
+# Broadcast sends run concurrently; discord.py still queues each request behind the global rate limit.
+BROADCAST_CONCURRENCY = 5
+BROADCAST_PROGRESS_INTERVAL = 5 # Seconds between progress message edits
+
+# Object types counted in memory reports: discord.py cache entries and our long-lived views
+TRACKED_OBJECT_TYPES = ('Member', 'User', 'Role', 'Message', 'Guild', 'TextChannel', 'VoiceChannel', 'Thread',
+                        'Emoji', 'PlayerListView', 'BroadcastConfirmationView', 'InfoView', 'AutoLinkConfirmationView')
+MEMORY_REPORT_TOP_N = 25
+# Applied to every snapshot, including the baseline, so compare_to diffs like for like
+MEMORY_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+)
+
 class BroadcastConfirmationView(discord.ui.View):
     def __init__(self, author, message_content, bot):
         super().__init__(timeout=60.0)
@@ -29,38 +53,12 @@ class BroadcastConfirmationView(discord.ui.View):
             item.disabled = True
         await interaction.edit_original_response(content="⏳ Broadcasting message to all servers...", view=self)
 
-        conn = sqlite3.connect('wom_multi.db')
-        c = conn.cursor()
-        c.execute("SELECT log_channel_id FROM guild_configs WHERE log_channel_id IS NOT NULL AND inactive_since IS NULL")
-        log_channel_ids = c.fetchall()
-        conn.close()
-
-        sent_count = 0
-        failed_count = 0
-
-        for (channel_id,) in log_channel_ids:
-            channel = self.bot.get_channel(channel_id)
-            if channel:
-                try:
-                    await channel.send(self.message_content)
-                    sent_count += 1
-                except discord.Forbidden:
-                    logger.warning(f"Failed to send broadcast to channel {channel_id}. Missing permissions.")
-                    failed_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to send broadcast to channel {channel_id}: {e}")
-                    failed_count += 1
-            else:
-                logger.warning(f"Could not find log channel with ID {channel_id} for broadcast.")
-                failed_count += 1
-            await asyncio.sleep(0.5)
-
         self.value = True
         self.stop()
-        
-        await interaction.edit_original_response(
-            content=f"✅ Broadcast complete.\nSent to **{sent_count}** servers.\nFailed for **{failed_count}** servers."
-        )
+
+        owner_cog = self.bot.get_cog('OwnerCog')
+        broadcast_id = owner_cog.create_broadcast(self.message_content, interaction.message)
+        await owner_cog.run_broadcast(broadcast_id)
 
     @discord.ui.button(label="Cancel", style=discord.ButtonStyle.red)
     async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -75,6 +73,187 @@ class BroadcastConfirmationView(discord.ui.View):
 class OwnerCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.resume_task = None
+        self.memory_snapshot = None
+
+    async def cog_load(self):
+        self.resume_task = self.bot.loop.create_task(self.resume_broadcasts())
+
+    def cog_unload(self):
+        if self.resume_task:
+            self.resume_task.cancel()
+
+    def memory_profile(self, action: str) -> str:
+        """
+        Handles the start, snapshot and stop memory profiling actions and returns a text report.
+        Snapshots are diffed against the previous snapshot, or against the one taken at start.
+        Runs on the event loop so the discord.py caches it counts can't change underneath it.
+        """
+        lines = [f"Memory report ({action}) at {datetime.datetime.now().isoformat()}"]
+        if resource:
+            # ru_maxrss is reported in kilobytes on Linux
+            lines.append(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+        if action == "start":
+            if tracemalloc.is_tracing():
+                return "tracemalloc is already running. Use `snapshot` or `stop`."
+            tracemalloc.start(10)
+            self.memory_snapshot = tracemalloc.take_snapshot().filter_traces(MEMORY_SNAPSHOT_FILTERS)
+            lines.append("tracemalloc started with a 10 frame traceback limit. Baseline snapshot taken.")
+        elif action in ("snapshot", "stop"):
+            if not tracemalloc.is_tracing():
+                return "tracemalloc is not running. Use `start` first."
+            snapshot = tracemalloc.take_snapshot().filter_traces(MEMORY_SNAPSHOT_FILTERS)
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"Traced memory: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB")
+            lines.append("")
+            lines.append(f"Top {MEMORY_REPORT_TOP_N} allocation sites by growth since the previous snapshot:")
+            for stat in snapshot.compare_to(self.memory_snapshot, 'lineno')[:MEMORY_REPORT_TOP_N]:
+                lines.append(f"  {stat}")
+            self.memory_snapshot = snapshot
+            if action == "stop":
+                tracemalloc.stop()
+                self.memory_snapshot = None
+                lines.append("")
+                lines.append("tracemalloc stopped.")
+        else:
+            return f"Unknown action '{action}'. Use start, snapshot or stop."
+
+        counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+        lines.append("")
+        lines.append("Object counts:")
+        for name in TRACKED_OBJECT_TYPES:
+            lines.append(f"  {name}: {counts.get(name, 0)}")
+        lines.append(f"  Cached guilds: {len(self.bot.guilds)}, cached users: {len(self.bot.users)}, "
+                     f"cached messages: {len(self.bot.cached_messages)}, persistent views: {len(self.bot.persistent_views)}")
+        return "\n".join(lines)
+
+    @app_commands.command(name="memprofile", description="Profile the bot's memory usage (Developer Only)")
+    @app_commands.describe(action="start tracing, take a snapshot diff, or stop tracing")
+    @app_commands.choices(
+        action=[
+            app_commands.Choice(name="start", value="start"),
+            app_commands.Choice(name="snapshot", value="snapshot"),
+            app_commands.Choice(name="stop", value="stop"),
+        ]
+    )
+    async def memprofile(self, interaction: discord.Interaction, action: app_commands.Choice[str]):
+        if interaction.user.id != self.bot.owner_id:
+            return await interaction.response.send_message("Restricted to Bot Developer.", ephemeral=True)
+
+        await interaction.response.defer(ephemeral=True)
+        report = self.memory_profile(action.value)
+        file = discord.File(io.BytesIO(report.encode('utf-8')), filename=f"memory_{action.value}_{datetime.datetime.now():%Y%m%d_%H%M%S}.txt")
+        await interaction.followup.send(f"🧠 Memory profiler: `{action.value}`", file=file, ephemeral=True)
+
+    def create_broadcast(self, content: str, progress_message: discord.Message) -> int:
+        """Records a broadcast job and one pending delivery row per active log channel."""
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("INSERT INTO broadcasts (content, status, created_at, progress_channel_id, progress_message_id) VALUES (?, 'running', ?, ?, ?)",
+                  (content, datetime.datetime.now().isoformat(), progress_message.channel.id, progress_message.id))
+        broadcast_id = c.lastrowid
+        c.execute("INSERT OR IGNORE INTO broadcast_deliveries (broadcast_id, channel_id, status) "
+                  "SELECT DISTINCT ?, log_channel_id, 'pending' FROM guild_configs WHERE log_channel_id IS NOT NULL AND inactive_since IS NULL",
+                  (broadcast_id,))
+        conn.commit()
+        conn.close()
+        return broadcast_id
+
+    async def resume_broadcasts(self):
+        await self.bot.wait_until_ready()
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("SELECT broadcast_id FROM broadcasts WHERE status = 'running'")
+        broadcast_ids = [row[0] for row in c.fetchall()]
+        conn.close()
+
+        for broadcast_id in broadcast_ids:
+            logger.info("Resuming unfinished broadcast %s.", broadcast_id)
+            await self.run_broadcast(broadcast_id)
+
+    async def run_broadcast(self, broadcast_id: int):
+        """Delivers a broadcast to its pending channels, live-editing the progress message as it goes."""
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("SELECT content, progress_channel_id, progress_message_id FROM broadcasts WHERE broadcast_id = ?", (broadcast_id,))
+        content, progress_channel_id, progress_message_id = c.fetchone()
+        # A delivery still marked 'sending' was cut off by a restart and may have gone out, so it is not retried
+        c.execute("UPDATE broadcast_deliveries SET status = 'failed', error = 'interrupted while sending' WHERE broadcast_id = ? AND status = 'sending'",
+                  (broadcast_id,))
+        conn.commit()
+        c.execute("SELECT status, COUNT(*) FROM broadcast_deliveries WHERE broadcast_id = ? GROUP BY status", (broadcast_id,))
+        counts = dict(c.fetchall())
+        c.execute("SELECT channel_id FROM broadcast_deliveries WHERE broadcast_id = ? AND status = 'pending'", (broadcast_id,))
+        pending = [row[0] for row in c.fetchall()]
+        conn.close()
+
+        sent_count = counts.get('sent', 0)
+        failed_count = counts.get('failed', 0)
+        total = sent_count + failed_count + len(pending)
+        semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        progress_message = self.bot.get_partial_messageable(progress_channel_id).get_partial_message(progress_message_id)
+
+        def set_status(channel_id, status, error=None):
+            conn = sqlite3.connect('wom_multi.db')
+            c = conn.cursor()
+            c.execute("UPDATE broadcast_deliveries SET status = ?, error = ? WHERE broadcast_id = ? AND channel_id = ?",
+                      (status, error, broadcast_id, channel_id))
+            conn.commit()
+            conn.close()
+
+        async def update_progress(final=False):
+            if final:
+                text = f"✅ Broadcast complete.\nSent to **{sent_count}** servers.\nFailed for **{failed_count}** servers."
+            else:
+                text = f"⏳ Broadcasting message to all servers... **{sent_count + failed_count}/{total}** processed ({failed_count} failed)."
+            try:
+                await progress_message.edit(content=text)
+            except discord.HTTPException as e:
+                logger.warning("Could not update progress message for broadcast %s: %s", broadcast_id, e)
+
+        async def deliver(channel_id):
+            nonlocal sent_count, failed_count
+            async with semaphore:
+                channel = self.bot.get_channel(channel_id)
+                if not channel:
+                    logger.warning("Could not find log channel with ID %s for broadcast.", channel_id)
+                    failed_count += 1
+                    await asyncio.to_thread(set_status, channel_id, 'failed', 'channel not found')
+                    return
+                # Recorded before sending so a restart mid-send never delivers the message twice
+                await asyncio.to_thread(set_status, channel_id, 'sending')
+                try:
+                    await channel.send(content)
+                except discord.Forbidden:
+                    logger.warning("Failed to send broadcast to channel %s. Missing permissions.", channel_id)
+                    failed_count += 1
+                    await asyncio.to_thread(set_status, channel_id, 'failed', 'missing permissions')
+                    return
+                except Exception as e:
+                    logger.error("Failed to send broadcast to channel %s: %s", channel_id, e)
+                    failed_count += 1
+                    await asyncio.to_thread(set_status, channel_id, 'failed', str(e)[:200])
+                    return
+                sent_count += 1
+                await asyncio.to_thread(set_status, channel_id, 'sent')
+
+        deliveries = asyncio.gather(*(deliver(channel_id) for channel_id in pending))
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(deliveries), timeout=BROADCAST_PROGRESS_INTERVAL)
+                break
+            except asyncio.TimeoutError:
+                await update_progress()
+
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("UPDATE broadcasts SET status = 'complete' WHERE broadcast_id = ?", (broadcast_id,))
+        conn.commit()
+        conn.close()
+
+        logger.info("Broadcast %s complete. Sent: %s, failed: %s.", broadcast_id, sent_count, failed_count)
+        await update_progress(final=True)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -107,8 +286,13 @@ class OwnerCog(commands.Cog):
             await confirm_msg.edit(content="Timed out. Broadcast cancelled.", embed=None, view=view)
 
     @app_commands.command(name="playerlist", description="Get a list of all linked players for this server")
+    @app_commands.describe(rsn_prefix="Only show players whose RSN starts with this text.",
+                           unresolved="Only show players whose RSN has not been found in the WOM group yet.",
+                           wom_role="Only show players with this WOM group role.",
+                           export="Send the full list as a CSV attachment instead.")
     @app_commands.checks.has_permissions(administrator=True)
-    async def playerlist(self, interaction: discord.Interaction):
+    async def playerlist(self, interaction: discord.Interaction, rsn_prefix: Optional[str] = None, unresolved: bool = False,
+                         wom_role: Optional[str] = None, export: bool = False):
         await interaction.response.defer(ephemeral=True)
 
         conn = sqlite3.connect('wom_multi.db')
@@ -122,16 +306,23 @@ class OwnerCog(commands.Cog):
             return
 
         group_id = config[0]
-        
-        c.execute("SELECT discord_id, rsn FROM links WHERE guild_id = ?", (interaction.guild_id,))
-        links = c.fetchall()
         conn.close()
 
-        if not links:
-            await interaction.followup.send("No players have been linked in this server yet. Use `/linkuser` to add one.")
+        filters = {'rsn_prefix': rsn_prefix, 'unresolved': unresolved, 'wom_role': wom_role}
+        total = await self.bot.storage.count_links(interaction.guild_id, **filters)
+
+        if not total:
+            if rsn_prefix or unresolved or wom_role:
+                await interaction.followup.send("No linked players match those filters.")
+            else:
+                await interaction.followup.send("No players have been linked in this server yet. Use `/linkuser` to add one.")
             return
 
-        view = PlayerListView(interaction, links, interaction.guild.name, group_id)
+        if export:
+            await interaction.followup.send(f"📄 {total} linked players.", file=await export_links_csv(self.bot.storage, interaction.guild_id, **filters), ephemeral=True)
+            return
+
+        view = PlayerListView(interaction, interaction.guild.name, group_id, total, **filters)
         embed = await view.get_embed()
         view.update_buttons()
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
@@ -149,44 +340,40 @@ class OwnerCog(commands.Cog):
         if not tasks_cog:
             return await interaction.followup.send("Tasks cog is not loaded.")
 
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
         if group_id:
-            conn = sqlite3.connect('wom_multi.db')
-            c = conn.cursor()
-            c.execute("SELECT guild_id, log_channel_id, nickname_enforcement, dm_notifications_on FROM guild_configs WHERE group_id = ?", (group_id,))
-            config = c.fetchone()
-            conn.close()
-
-            if config:
-                target_guild_id, log_channel_id, nickname_enforcement, dm_notifications_on = config[0], config[1], config[2], config[3]
-                guild = self.bot.get_guild(target_guild_id)
-                if guild:
-                    synced, failed, checked = await tasks_cog.sync_guild(guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on)
-                    logger.info(f"Manual sync finished for Group ID {group_id}. {checked} members checked, {synced} updated, {failed} failed.")
-                    await interaction.followup.send(f"Sync finished for Group ID **{group_id}** in guild **{guild.name}**.\n"
-                                                      f"Checked: `{checked}`\n"
-                                                      f"Updated: `{synced}`\n"
-                                                      f"Failed: `{failed}`")
-                else:
-                    await interaction.followup.send(f"Bot is not in the guild associated with Group ID **{group_id}** (Guild ID: {target_guild_id}). Sync cannot be performed.")
-            else:
-                await interaction.followup.send(f"No guild found configured for Group ID **{group_id}**.")
+            c.execute("SELECT guild_id FROM guild_configs WHERE group_id = ?", (group_id,))
         else:
-            conn = sqlite3.connect('wom_multi.db')
-            c = conn.cursor()
-            c.execute("SELECT group_id, log_channel_id, nickname_enforcement, dm_notifications_on FROM guild_configs WHERE guild_id = ?", (interaction.guild_id,))
-            res = c.fetchone()
-            conn.close()
+            c.execute("SELECT guild_id FROM guild_configs WHERE guild_id = ? AND group_id IS NOT NULL", (interaction.guild_id,))
+        config = c.fetchone()
+        conn.close()
 
-            if res:
-                group_id, log_channel_id, nickname_enforcement, dm_notifications_on = res[0], res[1], res[2], res[3]
-                synced, failed, checked = await tasks_cog.sync_guild(interaction.guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on)
-                logger.info(f"Manual sync finished for guild {interaction.guild.name}. {checked} members checked, {synced} updated, {failed} failed.")
-                await interaction.followup.send(f"Sync finished for **{interaction.guild.name}**.\n"
-                                                  f"Checked: `{checked}`\n"
-                                                  f"Updated: `{synced}`\n"
-                                                  f"Failed: `{failed}`")
+        if not config:
+            if group_id:
+                await interaction.followup.send(f"No guild found configured for Group ID **{group_id}**.")
             else:
                 await interaction.followup.send("No Group ID set for this server.")
+            return
+
+        target_guild_id = config[0]
+        guild = self.bot.get_guild(target_guild_id)
+        if not guild:
+            await interaction.followup.send(f"Bot is not in the guild associated with Group ID **{group_id}** (Guild ID: {target_guild_id}). Sync cannot be performed.")
+            return
+
+        result = await tasks_cog.enqueue_sync(target_guild_id, SYNC_PRIORITY_INTERACTIVE)
+        if not result:
+            await interaction.followup.send(f"Sync failed for **{guild.name}**. Check the logs for details.")
+            return
+
+        synced, failed, checked = result
+        label = f"Group ID **{group_id}** in guild **{guild.name}**" if group_id else f"**{guild.name}**"
+        logger.info("Manual sync finished for guild %s (%s). %s members checked, %s updated, %s failed.", guild.name, guild.id, checked, synced, failed)
+        await interaction.followup.send(f"Sync finished for {label}.\n"
+                                          f"Checked: `{checked}`\n"
+                                          f"Updated: `{synced}`\n"
+                                          f"Failed: `{failed}`")
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(OwnerCog(bot))
@@ -5,26 +5,477 @@ import datetime
 import logging
 import asyncio
 import os
-import shutil
-from main import WOM_API_KEY
+import json
+import time
+import zlib
+import csv
+import io
+from main import WOM_API_KEY, normalize_rsn, trace_span, current_span
 
 logger = logging.getLogger('WOMBot')
 
+# Detailed role_events rows older than this are compacted into role_event_daily totals.
+ROLE_EVENT_RETENTION_DAYS = int(os.getenv('ROLE_EVENT_RETENTION_DAYS') or 90)
+
+# A group's webhook events are processed once they have been quiet for GROUP_EVENT_DEBOUNCE seconds,
+# or GROUP_EVENT_MAX_DELAY seconds after the first event if they keep arriving.
+GROUP_EVENT_DEBOUNCE = 10
+GROUP_EVENT_MAX_DELAY = 60
+
+# Sync job queue. Lower priority values run first; requests for an already-queued guild are merged.
+SYNC_PRIORITY_INTERACTIVE = 0
+SYNC_PRIORITY_EVENT = 1
+SYNC_PRIORITY_BACKGROUND = 2
+SYNC_WORKERS = 2
+SYNCNOW_COOLDOWN = 10 * 60 # Minimum seconds between /syncnow requests for the same guild
+
+class SyncJob:
+    def __init__(self, guild_id, priority, max_age=None):
+        self.guild_id = guild_id
+        self.priority = priority
+        self.max_age = max_age
+        self.waiters = []
+
+# Stat-threshold roles. Player lookups (needed for total level) run in a background queue outside the
+# guild sync, spaced out to stay within WOM's rate limit. A lookup that fails is not retried for
+# PLAYER_FETCH_RETRY_SECONDS so a missing player doesn't cost a request every sync.
+THRESHOLD_METRICS = ('total_level', 'exp', 'ehp', 'ehb')
+PLAYER_FETCH_INTERVAL = 1.0
+PLAYER_FETCH_RETRY_SECONDS = 3600
+
+# Database maintenance. Incremental vacuum frees at most VACUUM_STEP_PAGES pages per write
+# transaction so syncs and the web API are never locked out for long.
+VACUUM_STEP_PAGES = 200
+DB_STATS_HISTORY_DAYS = 90
+
+# How old a cached group payload may be and still be trusted for the startup pass, which runs as soon
+# as the bot is ready. Older entries are revalidated with a conditional request.
+WARM_START_MAX_AGE = 60 * 60
+
+class WOMAPIError(Exception):
+    def __init__(self, status):
+        super().__init__(f"WOM API returned status {status}")
+        self.status = status
+
+# --- WOM GROUP CACHE ---
+# Memberships are stored as a zlib-compressed JSON list of [player_id, username, role] triples.
+def load_cached_group(group_id):
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute("SELECT fetched_at, etag, updated_at, memberships FROM wom_group_cache WHERE group_id = ?", (group_id,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return None
+    try:
+        memberships = json.loads(zlib.decompress(row[3]))
+    except (zlib.error, ValueError, TypeError) as e:
+        logger.warning("Discarding unreadable cache for group %s: %s", group_id, e)
+        return None
+    return {'fetched_at': row[0], 'etag': row[1], 'updated_at': row[2], 'memberships': memberships}
+
+def store_cached_group(group_id, memberships, etag, updated_at):
+    payload = zlib.compress(json.dumps(memberships, separators=(',', ':')).encode('utf-8'))
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO wom_group_cache (group_id, fetched_at, etag, updated_at, memberships) VALUES (?, ?, ?, ?, ?)",
+              (group_id, time.time(), etag, updated_at, payload))
+    conn.commit()
+    conn.close()
+
+# --- PLAYER STATS ---
+def group_has_thresholds(group_id):
+    """True if any guild syncing this group (as primary or extra group) has a stat threshold role."""
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute('''SELECT 1 FROM threshold_mappings WHERE guild_id IN
+                     (SELECT guild_id FROM guild_configs WHERE group_id = ? UNION SELECT guild_id FROM guild_groups WHERE group_id = ?)
+                 LIMIT 1''', (group_id, group_id))
+    found = c.fetchone() is not None
+    conn.close()
+    return found
+
+def store_player_stats(memberships):
+    """Upserts the stats that come with a group payload, keeping any cached total level. Rows whose WOM updatedAt is unchanged are left alone."""
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.executemany('''INSERT INTO player_stats (wom_id, updated_at, exp, ehp, ehb) VALUES (?, ?, ?, ?, ?)
+                     ON CONFLICT (wom_id) DO UPDATE SET updated_at = excluded.updated_at, exp = excluded.exp,
+                         ehp = excluded.ehp, ehb = excluded.ehb
+                     WHERE player_stats.updated_at IS NOT excluded.updated_at''',
+                  [(m['player']['id'], m['player'].get('updatedAt'), m['player'].get('exp'), m['player'].get('ehp'), m['player'].get('ehb'))
+                   for m in memberships])
+    conn.commit()
+    conn.close()
+
+def load_player_stats(wom_ids):
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute('''SELECT wom_id, total_level, exp, ehp, ehb, updated_at, level_updated_at, level_failed_at
+                 FROM player_stats WHERE wom_id IN (SELECT value FROM json_each(?))''', (json.dumps(list(wom_ids)),))
+    stats = {row[0]: {'total_level': row[1], 'exp': row[2], 'ehp': row[3], 'ehb': row[4], 'updated_at': row[5],
+                      'level_updated_at': row[6], 'level_failed_at': row[7]}
+             for row in c.fetchall()}
+    conn.close()
+    return stats
+
+def level_lookup_due(stats, now):
+    """True if the player's cached total level predates their WOM updatedAt and no recent lookup failed."""
+    if stats['level_updated_at'] == stats['updated_at']:
+        return False
+    return stats['level_failed_at'] is None or now - stats['level_failed_at'] >= PLAYER_FETCH_RETRY_SECONDS
+
+def store_total_levels(levels, failed_ids):
+    """Saves looked-up total levels as (level, updated_at, wom_id) and marks failed lookups with the current time."""
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.executemany("UPDATE player_stats SET total_level = ?, level_updated_at = ?, level_failed_at = NULL WHERE wom_id = ?", levels)
+    c.executemany("UPDATE player_stats SET level_failed_at = ? WHERE wom_id = ?", [(time.time(), wom_id) for wom_id in failed_ids])
+    conn.commit()
+    conn.close()
+
+def threshold_roles_for(stats, threshold_map):
+    """Returns the highest threshold role reached for each metric, given the player's stats."""
+    roles = set()
+    for metric, thresholds in threshold_map.items():
+        value = stats.get(metric) if stats else None
+        if value is None:
+            continue
+        # thresholds are sorted highest first
+        for min_value, role in thresholds:
+            if value >= min_value:
+                roles.add(role)
+                break
+    return roles
+
+# --- DATABASE MAINTENANCE ---
+# These run in a worker thread via asyncio.to_thread, each on its own connection.
+def checkpoint_wal(mode='PASSIVE'):
+    conn = sqlite3.connect('wom_multi.db')
+    busy, wal_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    conn.close()
+    return busy, wal_pages, checkpointed
+
+def optimize_database():
+    """Switches the file to incremental auto-vacuum if needed and refreshes query planner statistics."""
+    conn = sqlite3.connect('wom_multi.db')
+    converted = False
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        # The new mode only takes effect once the file is rebuilt, so this one VACUUM is unavoidable
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        converted = True
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.close()
+    return converted
+
+def incremental_vacuum_step(pages):
+    """Frees up to `pages` pages from the freelist and returns how many are left."""
+    # The pragma frees one page per step and execute() only steps once, so run it as a script in autocommit mode
+    conn = sqlite3.connect('wom_multi.db', isolation_level=None)
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.close()
+    return remaining
+
+def collect_database_stats():
+    conn = sqlite3.connect('wom_multi.db')
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.close()
+    wal_file = 'wom_multi.db-wal'
+    return {
+        'recorded_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'file_size': os.path.getsize('wom_multi.db'),
+        'wal_size': os.path.getsize(wal_file) if os.path.exists(wal_file) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+    }
+
+def backup_database_file(backup_file):
+    # The online backup API includes changes still sitting in the WAL, which a plain file copy would miss
+    source = sqlite3.connect('wom_multi.db')
+    dest = sqlite3.connect(backup_file)
+    with dest:
+        source.backup(dest)
+    dest.close()
+    source.close()
+
+# --- MULTI-GROUP GUILDS ---
+def get_guild_group_ids(guild_id, primary_group_id):
+    """Returns the guild's group ids in priority order, starting with the primary group."""
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute("SELECT group_id FROM guild_groups WHERE guild_id = ? AND group_id != ? ORDER BY priority, group_id", (guild_id, primary_group_id))
+    extra_group_ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return [primary_group_id] + extra_group_ids
+
+def merge_group_memberships(groups):
+    """Merges membership lists given in priority order. A player's entry from the highest priority group wins."""
+    merged = {}
+    for memberships in groups:
+        for membership in memberships:
+            merged.setdefault(membership[0], membership)
+    return list(merged.values())
+
+# --- SHARED PLAYER IDENTITIES ---
+def record_players(memberships):
+    """
+    Upserts the players from a freshly fetched group payload into the shared players table. A name is
+    only replaced by one from a newer WOM updatedAt, so a stale cached payload can't rename anyone back.
+    """
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.executemany('''INSERT INTO players (wom_id, username, normalized_name, updated_at) VALUES (?, ?, ?, ?)
+                     ON CONFLICT (wom_id) DO UPDATE SET username = excluded.username, normalized_name = excluded.normalized_name,
+                         updated_at = excluded.updated_at
+                     WHERE (players.username IS NOT excluded.username OR players.updated_at IS NULL)
+                         AND (players.updated_at IS NULL OR excluded.updated_at > players.updated_at)''',
+                  [(m['player']['id'], m['player']['username'], normalize_rsn(m['player']['username']), m['player'].get('updatedAt'))
+                   for m in memberships])
+    conn.commit()
+    conn.close()
+
+def load_player_names(wom_ids):
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute("SELECT wom_id, username FROM players WHERE wom_id IN (SELECT value FROM json_each(?))", (json.dumps(list(wom_ids)),))
+    names = dict(c.fetchall())
+    conn.close()
+    return names
+
+def record_remote_renames(renamed):
+    """
+    Records renames applied to other guilds' links as (guild_id, discord_id, old_rsn, new_rsn): a
+    'rename' role event each, plus a buffered report so the guild's next log digest lists them.
+    """
+    now_epoch = int(time.time())
+    now = datetime.datetime.now().isoformat()
+    by_guild = {}
+    for guild_id, discord_id, old_rsn, new_rsn in renamed:
+        by_guild.setdefault(guild_id, []).append((discord_id, old_rsn, new_rsn))
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.executemany("INSERT INTO role_events (guild_id, discord_id, event_type, old_value, new_value, created_at) VALUES (?, ?, 'rename', ?, ?, ?)",
+                  [(guild_id, discord_id, old_rsn, new_rsn, now_epoch) for guild_id, discord_id, old_rsn, new_rsn in renamed])
+    # Rename-only reports leave out the per-sync fields, so merging them keeps the last full sync's values
+    c.executemany("INSERT INTO sync_log_buffer (guild_id, created_at, report) VALUES (?, ?, ?)",
+                  [(guild_id, now, json.dumps({'role_updates': [], 'name_changes': changes, 'nickname_changes': [], 'removed_users_count': 0},
+                                              separators=(',', ':')))
+                   for guild_id, changes in by_guild.items()])
+    conn.commit()
+    conn.close()
+
+# --- SYNC LOG REPORTS ---
+# Reports hold compact records rather than formatted lines: role_updates are [discord_id, rsn,
+# removed_role_ids, new_role_ids], name_changes and nickname_changes are [discord_id, old, new]
+# and unfound_rsns are [discord_id, rsn]. Lines are only formatted while they fit in the embed.
+REPORT_SECTIONS = (
+    ('role_updates', "👥 Role Updates"),
+    ('name_changes', "✍️ RSN Updates (from WOM)"),
+    ('nickname_changes', "✍️ Nickname Updates"),
+    ('unfound_rsns', "❓ RSN Not Found in WOM Group. Use `/unlinkuser [@user]` if user is not in the clan."),
+)
+EMBED_FIELD_LIMIT = 1024
+EMBED_TOTAL_LIMIT = 6000 # Discord's limit across title, description, footer and all fields
+OVERFLOW_NOTE_RESERVE = 48 # Room kept at the end of a full field for the "...and N more" line
+OVERFLOW_FILE_NAME = 'sync_report.csv'
+
+def format_report_record(section, record):
+    if isinstance(record, str): # Reports buffered before records were structured
+        return record
+    if section == 'role_updates':
+        discord_id, rsn, removed_role_ids, new_role_ids = record
+        old_roles = ', '.join(f"<@&{role_id}>" for role_id in removed_role_ids) or "(none)"
+        new_roles = ', '.join(f"<@&{role_id}>" for role_id in new_role_ids) or "(none)"
+        return f"▫️ <@{discord_id}> (`{rsn}`): {old_roles} → {new_roles}"
+    if section == 'unfound_rsns':
+        discord_id, rsn = record
+        return f"▫️ <@{discord_id}> (RSN: `{rsn}`)"
+    discord_id, old, new = record
+    return f"▫️ <@{discord_id}>: `{old}` → `{new}`"
+
+def fill_report_field(section, records, budget):
+    """Formats records until budget characters are used. Returns (field value, records that did not fit)."""
+    lines = []
+    length = 0
+    for index, record in enumerate(records):
+        line = format_report_record(section, record)
+        # The last record may use the space reserved for the overflow note
+        limit = budget if index == len(records) - 1 else budget - OVERFLOW_NOTE_RESERVE
+        if length + len(line) + 1 > limit:
+            overflow = records[index:]
+            lines.append(f"…and {len(overflow)} more in {OVERFLOW_FILE_NAME}")
+            return "\n".join(lines), overflow
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines), []
+
+def build_sync_embed(title, report, description=None):
+    """Returns (embed, overflow) where overflow maps report sections to the records left out of the embed."""
+    embed = discord.Embed(
+        title=title,
+        description=description,
+        color=discord.Color.blue(),
+        timestamp=datetime.datetime.now()
+    )
+    embed.set_footer(text="WOM Role Sync")
+
+    summary_fields = []
+    if report['removed_users_count'] > 0:
+        summary_fields.append(("🗑️ Users Removed", f"{report['removed_users_count']} users removed from DB (no longer in server)."))
+    if report['failed_members'] > 0:
+        summary_fields.append(("⚠️ Failures", f"{report['failed_members']} members could not be updated due to permission errors."))
+    if report.get('permission_warnings'):
+        summary_fields.append(("🔒 Permission Issues", "\n".join(report['permission_warnings'])[:EMBED_FIELD_LIMIT]))
+    if report.get('group_warnings'):
+        summary_fields.append(("📡 Group Fetch Issues", "\n".join(report['group_warnings'])[:EMBED_FIELD_LIMIT]))
+
+    # Summary fields are short and always shown, so their space is set aside before the lists are filled
+    used = len(title) + len(description or '') + len("WOM Role Sync") + sum(len(name) + len(value) for name, value in summary_fields)
+    used += sum(len(name) for section, name in REPORT_SECTIONS if report[section])
+    section_fields = {}
+    overflow = {}
+    for section, name in REPORT_SECTIONS:
+        records = report[section]
+        if not records:
+            continue
+        budget = min(EMBED_FIELD_LIMIT, EMBED_TOTAL_LIMIT - used)
+        if budget < OVERFLOW_NOTE_RESERVE:
+            overflow[section] = records
+            continue
+        value, left_over = fill_report_field(section, records, budget)
+        section_fields[section] = (name, value)
+        used += len(value)
+        if left_over:
+            overflow[section] = left_over
+
+    for section in ('role_updates', 'name_changes', 'nickname_changes'):
+        if section in section_fields:
+            embed.add_field(name=section_fields[section][0], value=section_fields[section][1], inline=False)
+    for name, value in summary_fields:
+        embed.add_field(name=name, value=value, inline=False)
+    if 'unfound_rsns' in section_fields:
+        embed.add_field(name=section_fields['unfound_rsns'][0], value=section_fields['unfound_rsns'][1], inline=False)
+
+    if not embed.fields and not description:
+        embed.description = "✅ Sync complete. No changes were needed."
+    return embed, overflow
+
+def build_overflow_file(guild, overflow):
+    """Writes the records left out of a sync embed to a CSV attachment, with role IDs resolved to names."""
+    def role_names(role_ids):
+        roles = [(role_id, guild.get_role(role_id)) for role_id in role_ids]
+        return ', '.join(role.name if role else str(role_id) for role_id, role in roles)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['section', 'discord_id', 'rsn', 'old', 'new'])
+    for section, _ in REPORT_SECTIONS:
+        for record in overflow.get(section, []):
+            if isinstance(record, str):
+                writer.writerow([section, '', '', '', record])
+            elif section == 'role_updates':
+                writer.writerow([section, record[0], record[1], role_names(record[2]), role_names(record[3])])
+            elif section == 'unfound_rsns':
+                writer.writerow([section, record[0], record[1], '', ''])
+            else:
+                writer.writerow([section, record[0], record[2], record[1], record[2]])
+    return discord.File(io.BytesIO(buffer.getvalue().encode('utf-8')), filename=OVERFLOW_FILE_NAME)
+
+async def send_sync_report(channel, guild, title, report, description=None):
+    """Sends the report as one embed, attaching whatever did not fit as a CSV file."""
+    embed, overflow = build_sync_embed(title, report, description=description)
+    file = build_overflow_file(guild, overflow) if overflow else None
+    await channel.send(embed=embed, file=file)
+
+def buffer_sync_report(guild_id, report):
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute("INSERT INTO sync_log_buffer (guild_id, created_at, report) VALUES (?, ?, ?)",
+              (guild_id, datetime.datetime.now().isoformat(), json.dumps(report, separators=(',', ':'))))
+    conn.commit()
+    conn.close()
+
+def merge_sync_reports(reports):
+    """
+    Combines buffered reports into one. Changes and removals accumulate, while failures, unfound
+    RSNs and permission warnings repeat on every sync, so only the latest report's values are kept.
+    """
+    merged = {'role_updates': [], 'name_changes': [], 'nickname_changes': [], 'removed_users_count': 0,
+              'failed_members': 0, 'unfound_rsns': [], 'permission_warnings': [], 'group_warnings': []}
+    for report in reports:
+        merged['role_updates'].extend(report['role_updates'])
+        merged['name_changes'].extend(report['name_changes'])
+        merged['nickname_changes'].extend(report['nickname_changes'])
+        merged['removed_users_count'] += report['removed_users_count']
+    # Renames recorded from another guild's sync carry no per-sync fields
+    sync_reports = [report for report in reports if 'failed_members' in report]
+    if sync_reports:
+        merged['failed_members'] = sync_reports[-1]['failed_members']
+        merged['unfound_rsns'] = sync_reports[-1]['unfound_rsns']
+        merged['permission_warnings'] = sync_reports[-1].get('permission_warnings', [])
+        merged['group_warnings'] = sync_reports[-1].get('group_warnings', [])
+    return merged
+
+def touch_cached_group(group_id):
+    conn = sqlite3.connect('wom_multi.db')
+    c = conn.cursor()
+    c.execute("UPDATE wom_group_cache SET fetched_at = ? WHERE group_id = ?", (time.time(), group_id))
+    conn.commit()
+    conn.close()
+
 class TasksCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # The first pass after a restart reuses recent cached payloads instead of refetching every group.
+        self.warm_start = True
+        self.reminder_wakeup = asyncio.Event()
+        self.pass_lock = asyncio.Lock()
+        self.draining = False
+        self.active_syncs = 0
+        self.level_queue = {} # wom_id -> (username, updated_at) waiting for a total level lookup
+        self.level_task = None
+        self.sync_queue = asyncio.PriorityQueue()
+        self.queued_jobs = {} # guild_id -> SyncJob waiting in the queue
+        self.guild_locks = {} # guild_id -> asyncio.Lock held while that guild syncs
+        self.guild_lock_users = {} # guild_id -> workers holding or waiting on that lock; idle locks are dropped
+        self.queue_counter = 0 # Keeps queue order FIFO within a priority
+        self.last_interactive_sync = {} # guild_id -> time.monotonic() of the last /syncnow
+        self.sync_workers = [self.bot.loop.create_task(self.sync_worker()) for _ in range(SYNC_WORKERS)]
+        self.resume_task = self.bot.loop.create_task(self.resume_sync_pass())
         self.sync_roles_loop.start()
         self.cleanup_inactive_guilds.start()
         self.backup_database.start()
         self.update_stats.start()
         self.check_reminders.start()
+        self.flush_log_digests.start()
+        self.compact_role_events.start()
+        self.process_group_events.start()
+        self.checkpoint_database.start()
+        self.maintain_database.start()
 
     def cog_unload(self):
+        self.resume_task.cancel()
+        if self.level_task:
+            self.level_task.cancel()
+        for worker in self.sync_workers:
+            worker.cancel()
         self.sync_roles_loop.cancel()
         self.cleanup_inactive_guilds.cancel()
         self.backup_database.cancel()
         self.update_stats.cancel()
         self.check_reminders.cancel()
+        self.flush_log_digests.cancel()
+        self.compact_role_events.cancel()
+        self.process_group_events.cancel()
+        self.checkpoint_database.cancel()
+        self.maintain_database.cancel()
 
     @tasks.loop(minutes=5)
     async def update_stats(self):
@@ -32,17 +483,142 @@ class TasksCog(commands.Cog):
         
         server_count = len(self.bot.guilds)
         
-        conn = sqlite3.connect('wom_multi.db')
-        c = conn.cursor()
-        c.execute("INSERT OR REPLACE INTO bot_stats (key, value) VALUES (?, ?)", ('server_count', str(server_count)))
-        conn.commit()
-        conn.close()
-        logger.info(f"Updated server count to {server_count}")
+        await self.bot.storage.set_stat('server_count', str(server_count))
+        logger.info("Updated server count to %s", server_count)
 
-    async def sync_guild(self, guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on):
-        log_channel = self.bot.get_channel(log_channel_id) if log_channel_id else None
-        url = f"https://api.wiseoldman.net/v2/groups/{group_id}"
+    async def fetch_group_memberships(self, group_id, max_age=None):
+        """
+        Returns the group's memberships as (player_id, username, role) triples.
+        A cached payload younger than max_age is returned without contacting WOM; otherwise
+        the cache validators are sent so an unchanged group costs only a 304.
+        """
+        with trace_span('wom.fetch', group_id=group_id) as span:
+            cached = load_cached_group(group_id)
+            if cached and max_age is not None and time.time() - cached['fetched_at'] < max_age:
+                logger.info("Using cached memberships for group %s (warm start).", group_id)
+                span.set_attribute('cache', 'warm_start')
+                return cached['memberships']
+
+            url = f"https://api.wiseoldman.net/v2/groups/{group_id}"
+            headers = {"x-api-key": WOM_API_KEY, "User-Agent": "MultiServerSyncBot/2.4"}
+            if cached and cached['etag']:
+                headers["If-None-Match"] = cached['etag']
+
+            async with self.bot.http_session.get(url, headers=headers, timeout=30) as response:
+                span.set_attribute('http.status', response.status)
+                if response.status == 304 and cached:
+                    touch_cached_group(group_id)
+                    span.set_attribute('cache', 'not_modified')
+                    return cached['memberships']
+                if response.status != 200:
+                    raise WOMAPIError(response.status)
+                with trace_span('wom.decode') as decode_span:
+                    data = await response.json()
+                    memberships = [[m['player']['id'], m['player']['username'], m['role']] for m in data.get('memberships', [])]
+                    decode_span.set_attribute('members', len(memberships))
+                etag = response.headers.get('ETag')
+
+            with trace_span('db.write', table='wom_group_cache'):
+                store_cached_group(group_id, memberships, etag, data.get('updatedAt'))
+                record_players(data.get('memberships', []))
+                if group_has_thresholds(group_id):
+                    store_player_stats(data.get('memberships', []))
+            return memberships
+
+    def queue_total_levels(self, players):
+        """
+        Queues (wom_id, username, updated_at) players for a total level lookup. Lookups run in the
+        background, so the guild sync that found them uses the cached levels and the next sync picks up the new ones.
+        """
+        for wom_id, username, updated_at in players:
+            self.level_queue[wom_id] = (username, updated_at)
+        if self.level_queue and (self.level_task is None or self.level_task.done()):
+            self.level_task = self.bot.loop.create_task(self.refresh_total_levels())
+
+    async def refresh_total_levels(self):
+        """Works through the level queue one request per PLAYER_FETCH_INTERVAL, saving results as it goes."""
+        # The task copied the context of the sync that queued it, whose trace is exported long before
+        # this finishes; each lookup is traced as its own root span instead.
+        current_span.set(None)
         headers = {"x-api-key": WOM_API_KEY, "User-Agent": "MultiServerSyncBot/2.4"}
+        while self.level_queue and not self.draining:
+            wom_id = next(iter(self.level_queue))
+            username, updated_at = self.level_queue.pop(wom_id)
+            levels, failed_ids = [], []
+            try:
+                with trace_span('wom.fetch_player_stats', wom_id=wom_id) as span:
+                    url = f"https://api.wiseoldman.net/v2/players/{username}"
+                    async with self.bot.http_session.get(url, headers=headers, timeout=30) as response:
+                        span.set_attribute('http.status', response.status)
+                        if response.status == 429:
+                            logger.warning("WOM rate limit hit while fetching player stats. %s queued players will be retried next sync.", len(self.level_queue) + 1)
+                            self.level_queue.clear()
+                            return
+                        if response.status == 200:
+                            data = await response.json()
+                            level = ((data.get('latestSnapshot') or {}).get('data', {}).get('skills', {}).get('overall', {}) or {}).get('level')
+                            levels.append((level, updated_at, wom_id))
+                        elif response.status == 404:
+                            # Gone from WOM: cache "no level" until the group reports a new updatedAt
+                            levels.append((None, updated_at, wom_id))
+                        else:
+                            failed_ids.append(wom_id)
+            except Exception as e:
+                failed_ids.append(wom_id)
+                logger.warning("Failed to fetch stats for player %s: %s", username, e, extra={'phase': 'player_stats', 'sample': True})
+            await asyncio.to_thread(store_total_levels, levels, failed_ids)
+            await asyncio.sleep(PLAYER_FETCH_INTERVAL)
+
+    async def fetch_guild_groups(self, guild_id, group_id, max_age=None):
+        """
+        Fetches all of the guild's groups concurrently. Returns ([(group_id, memberships)] in priority
+        order, {group_id: error}) where a group that failed falls back to its cached memberships if it
+        has any. Raises the first error only if no group has memberships at all.
+        """
+        group_ids = get_guild_group_ids(guild_id, group_id)
+        results = await asyncio.gather(*(self.fetch_group_memberships(gid, max_age=max_age) for gid in group_ids), return_exceptions=True)
+        groups = []
+        failed = {}
+        for gid, result in zip(group_ids, results):
+            if not isinstance(result, BaseException):
+                groups.append((gid, result))
+                continue
+            failed[gid] = result
+            cached = load_cached_group(gid)
+            if cached:
+                groups.append((gid, cached['memberships']))
+        if not groups:
+            raise next(iter(failed.values()))
+        return groups, failed
+
+    async def fetch_guild_memberships(self, guild_id, group_id, max_age=None):
+        """Fetches all of the guild's groups concurrently and merges them by priority."""
+        groups, _ = await self.fetch_guild_groups(guild_id, group_id, max_age=max_age)
+        if len(groups) == 1:
+            return groups[0][1]
+        return merge_group_memberships([memberships for _, memberships in groups])
+
+    async def sync_guild(self, guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on, max_age=None):
+        if self.draining:
+            logger.info("Skipping sync for guild %s: shutting down.", guild.id, extra={'guild_id': guild.id, 'group_id': group_id, 'phase': 'sync'})
+            return
+        self.active_syncs += 1
+        try:
+            with trace_span('sync_guild', guild_id=guild.id, group_id=group_id) as span:
+                result = await self._sync_guild(guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on, max_age=max_age)
+                if result:
+                    span.set_attribute('role_updates', result[0])
+                    span.set_attribute('failed_members', result[1])
+                    span.set_attribute('links', result[2])
+                return result
+        finally:
+            self.active_syncs -= 1
+
+    async def _sync_guild(self, guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on, max_age=None):
+        log_channel = self.bot.get_channel(log_channel_id) if log_channel_id else None
+        log_fields = {'guild_id': guild.id, 'group_id': group_id, 'phase': 'sync'}
+        # Per-member messages repeat every sync, so they are sampled by the logging pipeline
+        member_log_fields = {**log_fields, 'phase': 'member', 'sample': True}
         
         role_updates = []
         name_changes = []
@@ -50,250 +626,693 @@ class TasksCog(commands.Cog):
         failed_members = 0
         unfound_rsns = []
         removed_users_count = 0
+        events = [] # (discord_id, event_type, old_value, new_value) rows for role_events
+        removed_links = []
+        link_updates = [] # (discord_id, rsn, wom_id, wom_role) for links whose stored values changed
 
         try:
-            async with self.bot.http_session.get(url, headers=headers, timeout=30) as response:
-                if response.status != 200:
-                    logger.error(f"API Error for guild {guild.id}: Status {response.status}")
-                    if log_channel:
-                        await log_channel.send(f"⚠️ **Sync Failed**: Could not connect to the Wise Old Man API (Error {response.status}). Please try again later or contact support if the issue persists.")
-                    return
-                data = await response.json()
-                memberships = data.get('memberships', [])
+            groups, failed_groups = await self.fetch_guild_groups(guild.id, group_id, max_age=max_age)
+        except WOMAPIError as e:
+            logger.error("API Error for guild %s: Status %s", guild.id, e.status, extra={**log_fields, 'phase': 'fetch'})
+            if log_channel:
+                await log_channel.send(f"⚠️ **Sync Failed**: Could not connect to the Wise Old Man API (Error {e.status}). Please try again later or contact support if the issue persists.")
+            return
         except Exception as e:
-            logger.error(f"API request failed for guild {guild.id}: {e}")
+            logger.error("API request failed for guild %s: %s", guild.id, e, extra={**log_fields, 'phase': 'fetch'})
             if log_channel:
                 await log_channel.send(f"⚠️ **Sync Failed**: An unexpected error occurred while trying to connect to the Wise Old Man API.")
             return
 
-        wom_roles = {m['player']['id']: m['role'] for m in memberships}
-        wom_usernames = {m['player']['id']: m['player']['username'] for m in memberships}
-        wom_id_by_username = {m['player']['username'].lower(): m['player']['id'] for m in memberships}
+        # A group that couldn't be fetched is synced from its cache if it has one. Without one its members
+        # can't be told apart from players who left, so linked players missing from the data are left alone.
+        group_warnings = []
+        missing_group_ids = [gid for gid in failed_groups if gid not in dict(groups)]
+        if failed_groups:
+            logger.warning("Could not fetch groups %s for guild %s: %s", list(failed_groups), guild.id,
+                           "; ".join(f"{gid}: {error}" for gid, error in failed_groups.items()), extra={**log_fields, 'phase': 'fetch'})
+            for gid, error in failed_groups.items():
+                status = f"Error {error.status}" if isinstance(error, WOMAPIError) else "request failed"
+                fallback = "its members were left unchanged" if gid in missing_group_ids else "cached data was used"
+                group_warnings.append(f"Could not fetch group **{gid}** from Wise Old Man ({status}); {fallback}.")
+
+        memberships = merge_group_memberships([group_memberships for _, group_memberships in groups])
+        # Per-group figures for group_summaries. A player counts towards the group whose entry won the
+        # merge; links that can't be placed in a group count towards the primary one.
+        player_group = {}
+        group_figures = {}
+        for gid, group_memberships in groups:
+            for player_id, _, _ in group_memberships:
+                player_group.setdefault(player_id, gid)
+            group_figures[gid] = {'members': len(group_memberships), 'linked': 0, 'unresolved': 0,
+                                  'role_changes': 0, 'name_changes': 0, 'nickname_changes': 0}
+        for gid in missing_group_ids:
+            group_figures[gid] = {'members': 0, 'linked': 0, 'unresolved': 0, 'role_changes': 0, 'name_changes': 0, 'nickname_changes': 0}
+
+        wom_roles = {player_id: role for player_id, _, role in memberships}
+        # The players table holds each player's newest known name, which wins over an older cached payload
+        player_names = load_player_names(player_id for player_id, _, _ in memberships)
+        wom_usernames = {player_id: player_names.get(player_id, username) for player_id, username, _ in memberships}
+        wom_id_by_username = {normalize_rsn(username): player_id for player_id, username, _ in memberships}
+
+        storage = self.bot.storage
+        with trace_span('db.read', table='links'):
+            links = await storage.get_links(guild.id)
+
+        # Renames are applied to every guild's links here. This guild's links were read above, so its
+        # own renames are logged by the member loop below; other guilds get theirs recorded now.
+        with trace_span('db.write', table='links', phase='rename'):
+            renamed = [row for row in await storage.rename_players(wom_usernames) if row[0] != guild.id]
+            if renamed:
+                record_remote_renames(renamed)
+                logger.info("Applied %s player renames to links in other guilds.", len(renamed), extra=log_fields)
 
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
 
-        c.execute("SELECT discord_id, rsn, wom_id, dm_notifications_on FROM links WHERE guild_id = ?", (guild.id,))
-        links = c.fetchall()
+        with trace_span('db.read', table='config'):
+            c.execute("SELECT log_mode FROM guild_configs WHERE guild_id = ?", (guild.id,))
+            log_mode_row = c.fetchone()
+            log_mode = log_mode_row[0] if log_mode_row else 'immediate'
+
+            role_mappings = await storage.get_role_mappings(guild.id)
+            role_map = {wom_role: guild.get_role(role_id) for wom_role, role_id in role_mappings.items() if guild.get_role(role_id)}
+
+            c.execute("SELECT metric, min_value, discord_role_id FROM threshold_mappings WHERE guild_id = ? ORDER BY metric, min_value DESC", (guild.id,))
+            threshold_map = {}
+            for metric, min_value, discord_role_id in c.fetchall():
+                role = guild.get_role(discord_role_id)
+                if role:
+                    threshold_map.setdefault(metric, []).append((min_value, role))
+        threshold_roles = {role for thresholds in threshold_map.values() for _, role in thresholds}
+        all_mapped_roles = set(role_map.values()) | threshold_roles
 
-        c.execute("SELECT wom_role, discord_role_id FROM role_mappings WHERE guild_id = ?", (guild.id,))
-        role_map = {row[0]: guild.get_role(row[1]) for row in c.fetchall() if guild.get_role(row[1])}
-        all_mapped_roles = set(role_map.values())
+        player_stats = {}
+        if threshold_map:
+            linked_wom_ids = {row[2] for row in links if row[2] in wom_usernames}
+            player_stats = load_player_stats(linked_wom_ids)
+            if 'total_level' in threshold_map:
+                now = time.time()
+                self.queue_total_levels([(wom_id, wom_usernames[wom_id], stats['updated_at'])
+                                         for wom_id, stats in player_stats.items() if level_lookup_due(stats, now)])
 
-        for discord_id, rsn, wom_id, user_dm_on in links:
+        # Work out up front which edits can succeed so doomed API calls are skipped
+        me = guild.me
+        can_manage_roles = me.guild_permissions.manage_roles
+        can_manage_nicknames = me.guild_permissions.manage_nicknames
+        unassignable_roles = {r for r in all_mapped_roles if not can_manage_roles or not r.is_assignable()}
+        skipped_role_changes = 0
+        skipped_nickname_changes = 0
+
+        for discord_id, rsn, wom_id, user_dm_on, stored_wom_role in links:
             member = guild.get_member(discord_id)
             if not member:
-                c.execute("DELETE FROM links WHERE guild_id = ? AND discord_id = ?", (guild.id, discord_id))
-                logger.info(f"Removed unlinked user {discord_id} from guild {guild.name} DB as they are no longer in the server.")
+                removed_links.append(discord_id)
+                logger.info("Removed unlinked user %s from guild %s DB as they are no longer in the server.", discord_id, guild.name, extra=member_log_fields)
                 removed_users_count += 1
                 continue
 
+            link_changed = False
             if not wom_id:
-                wom_id = wom_id_by_username.get(rsn.lower())
+                wom_id = wom_id_by_username.get(normalize_rsn(rsn))
                 if wom_id:
-                    c.execute("UPDATE links SET wom_id = ? WHERE guild_id = ? AND discord_id = ?", (wom_id, guild.id, discord_id))
+                    link_changed = True
                 else:
-                    unfound_rsns.append(f"▫️ {member.mention} (RSN: `{rsn}`)")
+                    unfound_rsns.append((discord_id, rsn))
+                    group_figures[group_id]['linked'] += 1
+                    group_figures[group_id]['unresolved'] += 1
                     continue
+            if missing_group_ids and wom_id not in wom_roles:
+                continue # May belong to a group that couldn't be fetched
+            figures = group_figures[player_group.get(wom_id, group_id)]
+            figures['linked'] += 1
 
             new_rsn = wom_usernames.get(wom_id)
             if new_rsn and new_rsn.lower() != rsn.lower():
-                name_changes.append(f"▫️ {member.mention}: `{rsn}` → `{new_rsn}`")
-                c.execute("UPDATE links SET rsn = ? WHERE guild_id = ? AND discord_id = ?", (new_rsn, guild.id, discord_id))
+                name_changes.append((discord_id, rsn, new_rsn))
+                figures['name_changes'] += 1
+                events.append((discord_id, 'rename', rsn, new_rsn))
+                link_changed = True
                 rsn = new_rsn
 
             current_wom_role = wom_roles.get(wom_id)
+            if link_changed or current_wom_role != stored_wom_role:
+                link_updates.append((discord_id, rsn, wom_id, current_wom_role))
             target_role = role_map.get(current_wom_role)
+            desired_roles = threshold_roles_for(player_stats.get(wom_id), threshold_map) if threshold_map else set()
+            if target_role:
+                desired_roles.add(target_role)
             
             member_roles = set(member.roles)
-            roles_to_add = [target_role] if target_role and target_role not in member_roles else []
-            roles_to_remove = [r for r in (all_mapped_roles - {target_role}) if r in member_roles]
+            roles_to_add = [r for r in desired_roles if r not in member_roles]
+            roles_to_remove = [r for r in (all_mapped_roles - desired_roles) if r in member_roles]
+            # A partial change would leave the member with neither their old nor their new rank
+            if unassignable_roles.intersection(roles_to_add + roles_to_remove):
+                skipped_role_changes += 1
+                roles_to_add, roles_to_remove = [], []
             
             try:
                 # Role update logic
                 if roles_to_add or roles_to_remove:
-                    await member.edit(roles=list((member_roles - set(roles_to_remove)) | set(roles_to_add)))
-                    old_role_mentions = [r.mention for r in roles_to_remove if r] or ["(none)"]
-                    new_role_mention = target_role.mention if target_role else "(none)"
-                    role_updates.append(f"▫️ {member.mention} (`{rsn}`): {', '.join(old_role_mentions)} → {new_role_mention}")
+                    with trace_span('discord.edit_roles', discord_id=discord_id):
+                        await member.edit(roles=list((member_roles - set(roles_to_remove)) | set(roles_to_add)))
+                    ordered_desired = sorted(desired_roles, reverse=True)
+                    role_updates.append((discord_id, rsn, [r.id for r in roles_to_remove], [r.id for r in ordered_desired]))
+                    figures['role_changes'] += 1
+                    events.append((discord_id, 'role', ', '.join(r.name for r in roles_to_remove) or None, ', '.join(r.name for r in ordered_desired) or None))
 
                     # DM notification logic
                     if dm_notifications_on and user_dm_on:
                         try:
+                            new_role_mention = ", ".join(r.mention for r in ordered_desired) or "(none)"
                             dm_message = (f"Your roles in **{guild.name}** have been updated.\n"
                                           f"Your new role is: {new_role_mention}.\n\n"
                                           f"To disable these notifications, use the `/notifyme off` command in the server.")
-                            await member.send(dm_message)
+                            with trace_span('discord.dm', discord_id=discord_id):
+                                await member.send(dm_message)
                         except discord.Forbidden:
-                            logger.warning(f"Could not send role update DM to {member.name} ({member.id}). They may have DMs disabled.")
+                            logger.warning("Could not send role update DM to %s (%s). They may have DMs disabled.", member.name, member.id, extra=member_log_fields)
                         except Exception as e:
-                            logger.error(f"Failed to send role update DM to {member.name} ({member.id}): {e}")
+                            logger.error("Failed to send role update DM to %s (%s): %s", member.name, member.id, e, extra=member_log_fields)
 
 
                 # Nickname enforcement logic
-                if nickname_enforcement and member.nick != rsn:
+                can_nick = can_manage_nicknames and member.id != guild.owner_id and me.top_role > member.top_role
+                if nickname_enforcement and member.nick != rsn and not can_nick:
+                    skipped_nickname_changes += 1
+                elif nickname_enforcement and member.nick != rsn:
                     original_nick = member.nick or member.name
-                    await member.edit(nick=rsn)
-                    nickname_changes.append(f"▫️ {member.mention}: `{original_nick}` → `{rsn}`")
-                    logger.info(f"Updated nickname for {member.name} in {guild.name} to {rsn}")
+                    with trace_span('discord.edit_nickname', discord_id=discord_id):
+                        await member.edit(nick=rsn)
+                    nickname_changes.append((discord_id, original_nick, rsn))
+                    figures['nickname_changes'] += 1
+                    events.append((discord_id, 'nickname', original_nick, rsn))
+                    logger.info("Updated nickname for %s in %s to %s", member.name, guild.name, rsn, extra=member_log_fields)
 
             except discord.Forbidden:
-                logger.warning(f"Permission error updating roles or nickname for {member} in {guild.name}")
+                logger.warning("Permission error updating roles or nickname for %s in %s", member, guild.name, extra=member_log_fields)
                 failed_members += 1
             except Exception as e:
-                logger.error(f"Failed to update roles or nickname for {member} in {guild.name}: {e}")
+                logger.error("Failed to update roles or nickname for %s in %s: %s", member, guild.name, e, extra=member_log_fields)
                 failed_members += 1
         
+        if events:
+            now_epoch = int(time.time())
+            with trace_span('db.write', table='role_events', rows=len(events)):
+                c.executemany("INSERT INTO role_events (guild_id, discord_id, event_type, old_value, new_value, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                              [(guild.id, d_id, event_type, old, new, now_epoch) for d_id, event_type, old, new in events])
+
         c.execute("UPDATE guild_configs SET last_sync = ? WHERE guild_id = ?", (datetime.datetime.now().isoformat(), guild.id))
         
-        if role_updates or name_changes or nickname_changes:
-            c.execute("UPDATE guild_configs SET last_change_timestamp = ? WHERE guild_id = ?", (datetime.datetime.now().isoformat(), guild.id))
+        permission_warnings = []
+        if skipped_role_changes:
+            if not can_manage_roles:
+                permission_warnings.append(f"I am missing the **Manage Roles** permission, so {skipped_role_changes} role changes were skipped.")
+            else:
+                blocked = ", ".join(r.mention for r in unassignable_roles)
+                permission_warnings.append(f"{skipped_role_changes} role changes were skipped because {blocked} are above my highest role or managed by an integration. Move my role above them.")
+        if skipped_nickname_changes:
+            if not can_manage_nicknames:
+                permission_warnings.append(f"I am missing the **Manage Nicknames** permission, so {skipped_nickname_changes} nickname changes were skipped.")
+            else:
+                permission_warnings.append(f"{skipped_nickname_changes} nicknames could not be changed because those members are the server owner or have a role at or above mine.")
+        if permission_warnings:
+            logger.warning("Skipped %s role and %s nickname changes in guild %s (%s) due to missing permissions or role hierarchy.",
+                           skipped_role_changes, skipped_nickname_changes, guild.name, guild.id, extra=log_fields)
 
-        conn.commit()
-        conn.close()
+        has_changes = bool(role_updates or name_changes or nickname_changes)
+        if has_changes:
+            c.execute("UPDATE guild_configs SET last_change_timestamp = ? WHERE guild_id = ?", (datetime.datetime.now(datetime.timezone.utc).isoformat(), guild.id))
 
-        if log_channel and (role_updates or name_changes or nickname_changes or failed_members > 0 or unfound_rsns or removed_users_count > 0):
-            embed = discord.Embed(
-                title=f"Sync Complete for {guild.name}",
-                color=discord.Color.blue(),
-                timestamp=datetime.datetime.now()
-            )
-            embed.set_footer(text="WOM Role Sync")
-
-            if role_updates:
-                embed.add_field(name="👥 Role Updates", value="\n".join(role_updates)[:1024], inline=False)
-            if name_changes:
-                embed.add_field(name="✍️ RSN Updates (from WOM)", value="\n".join(name_changes)[:1024], inline=False)
-            if nickname_changes:
-                embed.add_field(name="✍️ Nickname Updates", value="\n".join(nickname_changes)[:1024], inline=False)
-            if removed_users_count > 0:
-                embed.add_field(name="🗑️ Users Removed", value=f"{removed_users_count} users removed from DB (no longer in server).", inline=False)
-            if failed_members > 0:
-                 embed.add_field(name="⚠️ Failures", value=f"{failed_members} members could not be updated due to permission errors.", inline=False)
-            if unfound_rsns:
-                embed.add_field(name="❓ RSN Not Found in WOM Group. Use `/unlinkuser [@user]` if user is not in the clan.", value="\n".join(unfound_rsns)[:1024], inline=False)
-            
-            if not embed.fields:
-                embed.description = "✅ Sync complete. No changes were needed."
+        # One summary row per (group, guild), served by the API as is. Change counts
+        # describe the most recent sync that changed anything in that group, so a quiet sync keeps them.
+        now_iso = datetime.datetime.now().isoformat()
+        summary_rows = []
+        for gid, figures in group_figures.items():
+            if gid in failed_groups:
+                continue # Keep the last summary from a successful fetch
+            group_changed = bool(figures['role_changes'] or figures['name_changes'] or figures['nickname_changes'])
+            summary_rows.append((gid, guild.id, now_iso, figures['members'], figures['linked'], figures['unresolved'],
+                                 figures['role_changes'], figures['name_changes'], figures['nickname_changes'],
+                                 now_iso if group_changed else None, time.time(),
+                                 group_changed, group_changed, group_changed, group_changed))
+        c.executemany('''INSERT INTO group_summaries (group_id, guild_id, last_sync, member_count, linked_count, unresolved_count,
+                                                  role_changes, name_changes, nickname_changes, last_change_at, updated_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     ON CONFLICT (group_id, guild_id) DO UPDATE SET last_sync = excluded.last_sync, member_count = excluded.member_count,
+                         linked_count = excluded.linked_count, unresolved_count = excluded.unresolved_count, updated_at = excluded.updated_at,
+                         role_changes = CASE WHEN ? THEN excluded.role_changes ELSE role_changes END,
+                         name_changes = CASE WHEN ? THEN excluded.name_changes ELSE name_changes END,
+                         nickname_changes = CASE WHEN ? THEN excluded.nickname_changes ELSE nickname_changes END,
+                         last_change_at = CASE WHEN ? THEN excluded.last_change_at ELSE last_change_at END''',
+                  summary_rows)
+        # Drop rows for groups this guild no longer syncs
+        c.execute("DELETE FROM group_summaries WHERE guild_id = ? AND group_id NOT IN (SELECT value FROM json_each(?))",
+                  (guild.id, json.dumps(list(group_figures))))
+        # Changes restart the reminder timer; guilds without a scheduled reminder get their first one
+        c.execute("UPDATE guild_configs SET next_reminder_at = ? + reminder_interval_days * 86400 WHERE guild_id = ? AND reminder_interval_days > 0 AND (? OR next_reminder_at IS NULL)",
+                  (int(time.time()), guild.id, has_changes))
 
-            try:
-                await log_channel.send(embed=embed)
-            except discord.Forbidden:
-                logger.warning(f"Could not send log message to channel {log_channel_id} in guild {guild.id}. Missing permissions.")
+        with trace_span('db.commit'):
+            conn.commit()
+            conn.close()
+        with trace_span('db.write', table='links', removed=len(removed_links), updated=len(link_updates)):
+            await storage.apply_link_changes(guild.id, removed_links, link_updates)
+
+        report = {
+            'role_updates': role_updates,
+            'name_changes': name_changes,
+            'nickname_changes': nickname_changes,
+            'removed_users_count': removed_users_count,
+            'failed_members': failed_members,
+            'unfound_rsns': unfound_rsns,
+            'permission_warnings': permission_warnings,
+            'group_warnings': group_warnings,
+        }
+        if log_channel and (role_updates or name_changes or nickname_changes or failed_members > 0 or unfound_rsns or removed_users_count > 0
+                            or permission_warnings or group_warnings):
+            with trace_span('discord.log_send', log_mode=log_mode):
+                if log_mode in ('hourly', 'daily'):
+                    buffer_sync_report(guild.id, report)
+                else:
+                    try:
+                        await send_sync_report(log_channel, guild, f"Sync Complete for {guild.name}", report)
+                    except discord.Forbidden:
+                        logger.warning("Could not send log message to channel %s in guild %s. Missing permissions.", log_channel_id, guild.id, extra={**log_fields, 'phase': 'log'})
         
-        logger.info(f"Synced roles for guild {guild.name} ({guild.id}). {len(links)} members checked.")
+        logger.info("Synced roles for guild %s (%s). %s members checked.", guild.name, guild.id, len(links), extra=log_fields)
         return len(role_updates), failed_members, len(links)
 
 
+    def enqueue_sync(self, guild_id, priority, max_age=None):
+        """
+        Queues a sync for the guild and returns a future that resolves to sync_guild's result.
+        If the guild is already queued the requests are merged, keeping the more urgent priority.
+        """
+        future = self.bot.loop.create_future()
+        if self.draining:
+            future.set_result(None)
+            return future
+
+        job = self.queued_jobs.get(guild_id)
+        if job is not None:
+            job.waiters.append(future)
+            if max_age is None:
+                job.max_age = None # A request for fresh data wins over a cached one
+            if priority >= job.priority:
+                return future
+            # Re-queue at the better priority; the worker skips the stale entry
+            job.priority = priority
+        else:
+            job = SyncJob(guild_id, priority, max_age)
+            job.waiters.append(future)
+            self.queued_jobs[guild_id] = job
+
+        self.queue_counter += 1
+        self.sync_queue.put_nowait((job.priority, self.queue_counter, job))
+        return future
+
+    async def sync_worker(self):
+        await self.bot.wait_until_ready()
+        while True:
+            priority, _, job = await self.sync_queue.get()
+            # Skip stale entries left behind when a job was re-queued at a better priority
+            if self.queued_jobs.get(job.guild_id) is not job or priority != job.priority:
+                continue
+            del self.queued_jobs[job.guild_id]
+
+            result = None
+            lock = self.guild_locks.setdefault(job.guild_id, asyncio.Lock())
+            self.guild_lock_users[job.guild_id] = self.guild_lock_users.get(job.guild_id, 0) + 1
+            try:
+                async with lock:
+                    result = await self.sync_guild_by_id(job.guild_id, max_age=job.max_age)
+            except Exception as e:
+                logger.error("Queued sync failed for guild %s: %s", job.guild_id, e)
+            finally:
+                self.guild_lock_users[job.guild_id] -= 1
+                if not self.guild_lock_users[job.guild_id]:
+                    del self.guild_lock_users[job.guild_id]
+                    del self.guild_locks[job.guild_id]
+                for waiter in job.waiters:
+                    if not waiter.done():
+                        waiter.set_result(result)
+
+    async def sync_guild_by_id(self, guild_id, max_age=None):
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("SELECT group_id, log_channel_id, nickname_enforcement, dm_notifications_on FROM guild_configs WHERE guild_id = ?", (guild_id,))
+        config = c.fetchone()
+        conn.close()
+
+        guild = self.bot.get_guild(guild_id)
+        if not guild or not config or config[0] is None:
+            return None
+        group_id, log_channel_id, nickname_enforcement, dm_notifications_on = config
+        return await self.sync_guild(guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on, max_age=max_age)
+
+    def syncnow_cooldown_remaining(self, guild_id):
+        """Seconds until the guild may request another interactive sync, or 0 if it may now."""
+        last = self.last_interactive_sync.get(guild_id)
+        if last is None:
+            return 0
+        remaining = SYNCNOW_COOLDOWN - (time.monotonic() - last)
+        if remaining <= 0:
+            del self.last_interactive_sync[guild_id]
+            return 0
+        return remaining
+
+    async def run_sync_pass(self, resume=False):
+        """
+        Syncs every configured guild in guild_id order. Progress is checkpointed in bot_stats after
+        each guild, so a pass interrupted by a restart can resume after the last completed guild.
+        """
+        async with self.pass_lock:
+            storage = self.bot.storage
+            checkpoint_value = await storage.get_stat('sync_pass_checkpoint')
+
+            if resume:
+                if not checkpoint_value:
+                    return
+                checkpoint = json.loads(checkpoint_value)
+                logger.info("Resuming interrupted sync pass from %s after guild %s.", checkpoint['started_at'], checkpoint['last_guild_id'])
+            else:
+                checkpoint = {'started_at': datetime.datetime.now().isoformat(), 'last_guild_id': 0}
+                await storage.set_stat('sync_pass_checkpoint', json.dumps(checkpoint))
+
+            conn = sqlite3.connect('wom_multi.db')
+            c = conn.cursor()
+            c.execute("SELECT guild_id FROM guild_configs WHERE group_id IS NOT NULL AND guild_id > ? ORDER BY guild_id",
+                      (checkpoint['last_guild_id'],))
+            guild_ids = [row[0] for row in c.fetchall()]
+            conn.close()
+
+            max_age = WARM_START_MAX_AGE if self.warm_start else None
+            self.warm_start = False
+
+            for guild_id in guild_ids:
+                if self.draining:
+                    logger.info("Sync pass stopped for shutdown after guild %s. It will resume on restart.", checkpoint['last_guild_id'])
+                    return
+
+                guild = self.bot.get_guild(guild_id)
+                if guild:
+                    await self.enqueue_sync(guild_id, SYNC_PRIORITY_BACKGROUND, max_age=max_age)
+                    # A drain that started while the job was queued skips the sync, so keep this guild for the resumed pass
+                    if self.draining:
+                        logger.info("Sync pass stopped for shutdown before guild %s. It will resume on restart.", guild_id)
+                        return
+
+                checkpoint['last_guild_id'] = guild_id
+                await storage.set_stat('sync_pass_checkpoint', json.dumps(checkpoint))
+                if guild:
+                    await asyncio.sleep(2) # Stagger API requests
+            
+            current_time_iso = datetime.datetime.now().isoformat()
+            await storage.set_stat('last_global_sync', current_time_iso)
+            await storage.delete_stat('sync_pass_checkpoint')
+            logger.info("Sync pass finished. Global sync time updated to %s.", current_time_iso)
+
+    async def resume_sync_pass(self):
+        """
+        Runs the first pass after a restart. An interrupted pass is resumed; otherwise every guild is
+        synced straight away from cached memberships (warm start) rather than waiting for the next hour.
+        """
+        await self.bot.wait_until_ready()
+        if await self.bot.storage.get_stat('sync_pass_checkpoint'):
+            await self.run_sync_pass(resume=True)
+        else:
+            logger.info("Startup sync started.")
+            await self.run_sync_pass()
+
     @tasks.loop(time=[datetime.time(h) for h in range(24)])
     async def sync_roles_loop(self):
         await self.bot.wait_until_ready()
         logger.info("Hourly sync started.")
+        await self.run_sync_pass()
+
+    async def drain(self, timeout):
+        """Stops new syncs from starting and waits up to `timeout` seconds for in-flight ones to finish."""
+        self.draining = True
+        if self.active_syncs:
+            logger.info("Waiting up to %ss for %s in-flight guild syncs to finish.", timeout, self.active_syncs)
+        deadline = time.monotonic() + timeout
+        while self.active_syncs and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        if self.active_syncs:
+            logger.warning("Shutdown deadline reached with %s guild syncs still running.", self.active_syncs)
+
+    @tasks.loop(seconds=5)
+    async def process_group_events(self):
+        await self.bot.wait_until_ready()
+        now = time.time()
+
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("SELECT group_id FROM pending_group_events WHERE last_requested_at <= ? OR first_requested_at <= ?",
+                  (now - GROUP_EVENT_DEBOUNCE, now - GROUP_EVENT_MAX_DELAY))
+        group_ids = [row[0] for row in c.fetchall()]
+        if not group_ids:
+            conn.close()
+            return
+
+        c.executemany("DELETE FROM pending_group_events WHERE group_id = ?", [(group_id,) for group_id in group_ids])
+        conn.commit()
+
+        for group_id in group_ids:
+            c.execute("SELECT guild_id FROM guild_configs "
+                      "WHERE (group_id = ? OR guild_id IN (SELECT guild_id FROM guild_groups WHERE group_id = ?)) AND inactive_since IS NULL",
+                      (group_id, group_id))
+            guild_ids = [row[0] for row in c.fetchall()]
+            logger.info("Group %s update event received. Queueing sync for %s guilds.", group_id, len(guild_ids))
+            for guild_id in guild_ids:
+                self.enqueue_sync(guild_id, SYNC_PRIORITY_EVENT)
+        conn.close()
+
+    # Runs at half past each hour so a digest picks up the sync that ran on the hour
+    @tasks.loop(time=[datetime.time(h, 30) for h in range(24)])
+    async def flush_log_digests(self):
+        await self.bot.wait_until_ready()
+        # Daily digests go out at midnight UTC. Leftovers from guilds switched back to immediate are flushed too.
+        modes = ('hourly', 'immediate', 'daily') if datetime.datetime.now(datetime.timezone.utc).hour == 0 else ('hourly', 'immediate')
+
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
-        c.execute("SELECT guild_id, group_id, log_channel_id, nickname_enforcement, dm_notifications_on FROM guild_configs WHERE group_id IS NOT NULL")
-        configs = c.fetchall()
+        c.execute(f"SELECT DISTINCT b.guild_id, g.log_channel_id, g.log_mode FROM sync_log_buffer b JOIN guild_configs g ON g.guild_id = b.guild_id "
+                  f"WHERE g.log_mode IN ({','.join('?' * len(modes))})", modes)
+        guilds = c.fetchall()
 
-        for guild_id, group_id, log_channel_id, nickname_enforcement, dm_notifications_on in configs:
+        for guild_id, log_channel_id, log_mode in guilds:
+            c.execute("SELECT id, report FROM sync_log_buffer WHERE guild_id = ? ORDER BY id", (guild_id,))
+            rows = c.fetchall()
             guild = self.bot.get_guild(guild_id)
-            if not guild:
-                continue
-            
-            await self.sync_guild(guild, group_id, log_channel_id, nickname_enforcement, dm_notifications_on)
-            await asyncio.sleep(2) # Stagger API requests
-        
-        current_time_iso = datetime.datetime.now().isoformat()
-        c.execute("INSERT OR REPLACE INTO bot_stats (key, value) VALUES (?, ?)", ('last_global_sync', current_time_iso))
+            log_channel = self.bot.get_channel(log_channel_id) if log_channel_id else None
+
+            if guild and log_channel:
+                report = merge_sync_reports([json.loads(row[1]) for row in rows])
+                period = "Daily" if log_mode == 'daily' else "Hourly"
+                try:
+                    await send_sync_report(log_channel, guild, f"{period} Sync Digest for {guild.name}", report,
+                                           description=f"Summary of {len(rows)} syncs with changes.")
+                except discord.Forbidden:
+                    logger.warning("Could not send digest to channel %s in guild %s. Missing permissions.", log_channel_id, guild_id)
+                except Exception as e:
+                    logger.error("Failed to send digest to guild %s: %s", guild_id, e)
+                    continue
+
+            c.execute("DELETE FROM sync_log_buffer WHERE guild_id = ? AND id <= ?", (guild_id, rows[-1][0]))
+            conn.commit()
+
+        conn.close()
+        if guilds:
+            logger.info("Flushed sync log digests for %s guilds.", len(guilds))
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("UPDATE guild_configs SET inactive_since = ? WHERE guild_id = ? AND inactive_since IS NULL", (datetime.datetime.now().isoformat(), guild.id))
         conn.commit()
         conn.close()
-        logger.info(f"Hourly sync finished. Global sync time updated to {current_time_iso}.")
+        logger.warning("Bot was removed from guild %s. Marked as inactive.", guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("UPDATE guild_configs SET inactive_since = NULL WHERE guild_id = ? AND inactive_since IS NOT NULL", (guild.id,))
+        reactivated = c.rowcount
+        conn.commit()
+        conn.close()
+        if reactivated:
+            logger.info("Guild %s has become active again. Removed inactive marker.", guild.id)
 
     @tasks.loop(hours=24)
     async def cleanup_inactive_guilds(self):
         await self.bot.wait_until_ready()
         logger.info("Running daily cleanup of inactive guilds.")
+        now = datetime.datetime.now()
+        cutoff = (now - datetime.timedelta(days=30)).isoformat()
+        current_guild_ids = json.dumps([guild.id for guild in self.bot.guilds])
+
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
-        c.execute("SELECT guild_id, inactive_since FROM guild_configs")
-        all_guilds = c.fetchall()
 
-        guilds_to_delete = []
-        for guild_id, inactive_since_str in all_guilds:
-            guild = self.bot.get_guild(guild_id)
-
-            if guild:
-                if inactive_since_str:
-                    c.execute("UPDATE guild_configs SET inactive_since = NULL WHERE guild_id = ?", (guild_id,))
-                    logger.info(f"Guild {guild_id} has become active again. Removed inactive marker.")
-            else:
-                if not inactive_since_str:
-                    now_str = datetime.datetime.now().isoformat()
-                    c.execute("UPDATE guild_configs SET inactive_since = ? WHERE guild_id = ?", (now_str, guild_id))
-                    logger.warning(f"Bot is no longer in guild {guild_id}. Marked as inactive.")
-                else:
-                    inactive_since = datetime.datetime.fromisoformat(inactive_since_str)
-                    if datetime.datetime.now() - inactive_since > datetime.timedelta(days=30):
-                        guilds_to_delete.append(guild_id)
-        
-        for guild_id in guilds_to_delete:
-            c.execute("DELETE FROM guild_configs WHERE guild_id = ?", (guild_id,))
-            c.execute("DELETE FROM links WHERE guild_id = ?", (guild_id,))
-            c.execute("DELETE FROM role_mappings WHERE guild_id = ?", (guild_id,))
-            logger.info(f"Deleted all data for inactive guild {guild_id} after 30 day grace period.")
+        # Catch up on joins and removals that happened while the bot was offline
+        c.execute("UPDATE guild_configs SET inactive_since = ? WHERE inactive_since IS NULL AND guild_id NOT IN (SELECT value FROM json_each(?))",
+                  (now.isoformat(), current_guild_ids))
+        if c.rowcount:
+            logger.warning("Marked %s guilds the bot is no longer in as inactive.", c.rowcount)
+        c.execute("UPDATE guild_configs SET inactive_since = NULL WHERE inactive_since IS NOT NULL AND guild_id IN (SELECT value FROM json_each(?))",
+                  (current_guild_ids,))
 
+        c.execute("SELECT guild_id FROM guild_configs WHERE inactive_since < ?", (cutoff,))
+        expired_guild_ids = [row[0] for row in c.fetchall()]
         conn.commit()
+
+        if expired_guild_ids:
+            # The SQLite tables go in one transaction that also queues the guilds for a storage purge,
+            # so links and role mappings (possibly in another database) are never orphaned.
+            expired = json.dumps(expired_guild_ids)
+            for table in ('threshold_mappings', 'sync_log_buffer', 'guild_groups', 'group_summaries', 'role_events', 'role_event_daily', 'guild_configs'):
+                c.execute(f"DELETE FROM {table} WHERE guild_id IN (SELECT value FROM json_each(?))", (expired,))
+            c.execute("INSERT OR IGNORE INTO storage_purge_queue (guild_id) SELECT value FROM json_each(?)", (expired,))
+            conn.commit()
+            logger.info("Deleted all data for %s inactive guilds after 30 day grace period.", len(expired_guild_ids))
+
+        # Purging storage is idempotent; guilds stay queued until it succeeds and are retried on the next run.
+        # A guild that was set up again in the meantime keeps its new links.
+        c.execute("DELETE FROM storage_purge_queue WHERE guild_id IN (SELECT guild_id FROM guild_configs)")
+        c.execute("SELECT guild_id FROM storage_purge_queue")
+        queued_guild_ids = [row[0] for row in c.fetchall()]
+        conn.commit() # Don't hold a write lock on wom_multi.db while the storage backend works
+        if queued_guild_ids:
+            try:
+                await self.bot.storage.purge_guilds(queued_guild_ids)
+            except Exception as e:
+                logger.error("Failed to purge storage for %s inactive guilds, will retry: %s", len(queued_guild_ids), e)
+            else:
+                c.execute("DELETE FROM storage_purge_queue WHERE guild_id IN (SELECT value FROM json_each(?))", (json.dumps(queued_guild_ids),))
+                conn.commit()
         conn.close()
         logger.info("Daily cleanup finished.")
 
     @tasks.loop(hours=24)
+    async def compact_role_events(self):
+        await self.bot.wait_until_ready()
+        cutoff = int(time.time()) - ROLE_EVENT_RETENTION_DAYS * 86400
+
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute('''INSERT INTO role_event_daily (guild_id, day, event_type, event_count)
+                     SELECT guild_id, date(created_at, 'unixepoch'), event_type, COUNT(*) FROM role_events
+                     WHERE created_at < ? GROUP BY guild_id, date(created_at, 'unixepoch'), event_type
+                     ON CONFLICT (guild_id, day, event_type) DO UPDATE SET event_count = event_count + excluded.event_count''', (cutoff,))
+        c.execute("DELETE FROM role_events WHERE created_at < ?", (cutoff,))
+        compacted = c.rowcount
+        conn.commit()
+        conn.close()
+        logger.info("Compacted %s role events older than %s days into daily totals.", compacted, ROLE_EVENT_RETENTION_DAYS)
+
+    @tasks.loop(minutes=15)
+    async def checkpoint_database(self):
+        await self.bot.wait_until_ready()
+        # A PASSIVE checkpoint never waits on readers or writers; whatever it can't copy back is picked up next time
+        try:
+            busy, wal_pages, checkpointed = await asyncio.to_thread(checkpoint_wal)
+            logger.info("WAL checkpoint copied %s of %s pages back to the database.", checkpointed, wal_pages, extra={'phase': 'db_maintenance', 'sample': True})
+        except sqlite3.Error as e:
+            logger.error("WAL checkpoint failed: %s", e)
+
+    @tasks.loop(time=datetime.time(4, 15))
+    async def maintain_database(self):
+        await self.bot.wait_until_ready()
+        logger.info("Running daily database maintenance.")
+        try:
+            if await asyncio.to_thread(optimize_database):
+                logger.info("Converted database to incremental auto-vacuum.")
+
+            freed = 0
+            before = await asyncio.to_thread(collect_database_stats)
+            remaining = before['freelist_count']
+            while remaining:
+                left = await asyncio.to_thread(incremental_vacuum_step, VACUUM_STEP_PAGES)
+                freed += remaining - left
+                if left >= remaining:
+                    break
+                remaining = left
+                # Let queued writers in between steps
+                await asyncio.sleep(0.1)
+
+            await asyncio.to_thread(checkpoint_wal, 'TRUNCATE')
+            stats = await asyncio.to_thread(collect_database_stats)
+        except sqlite3.Error as e:
+            logger.error("Database maintenance failed: %s", e)
+            return
+
+        storage = self.bot.storage
+        history = json.loads(await storage.get_stat('db_stats_history') or '[]')
+        history = (history + [stats])[-DB_STATS_HISTORY_DAYS:]
+        await storage.set_stat('db_stats', json.dumps(stats))
+        await storage.set_stat('db_stats_history', json.dumps(history))
+        logger.info("Database maintenance finished: freed %s pages, database is now %s bytes (%s pages, %s free).",
+                    freed, stats['file_size'], stats['page_count'], stats['freelist_count'])
+
+    @tasks.loop(seconds=0)
     async def check_reminders(self):
+        """Sleeps until the earliest scheduled reminder is due, then sends every reminder that is due."""
         await self.bot.wait_until_ready()
-        logger.info("Running daily reminder check.")
         conn = sqlite3.connect('wom_multi.db')
         c = conn.cursor()
-        c.execute("SELECT guild_id, log_channel_id, last_change_timestamp, reminder_interval_days FROM guild_configs WHERE group_id IS NOT NULL AND reminder_interval_days > 0 AND inactive_since IS NULL")
-        guilds_to_check = c.fetchall()
+        c.execute("SELECT MIN(next_reminder_at) FROM guild_configs WHERE next_reminder_at IS NOT NULL")
+        next_due = c.fetchone()[0]
+        conn.close()
 
-        now = datetime.datetime.now()
+        # Wake up at least hourly, or early when /reminder changes a schedule
+        delay = min(next_due - time.time(), 3600) if next_due is not None else 3600
+        if delay > 0:
+            self.reminder_wakeup.clear()
+            try:
+                await asyncio.wait_for(self.reminder_wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            return
 
-        for guild_id, log_channel_id, last_change_str, reminder_days in guilds_to_check:
-            if not log_channel_id:
-                continue
+        now = int(time.time())
+        conn = sqlite3.connect('wom_multi.db')
+        c = conn.cursor()
+        c.execute("SELECT guild_id, log_channel_id, reminder_interval_days, group_id, inactive_since FROM guild_configs WHERE next_reminder_at <= ?", (now,))
+        due_guilds = c.fetchall()
 
+        for guild_id, log_channel_id, reminder_days, group_id, inactive_since in due_guilds:
             guild = self.bot.get_guild(guild_id)
-            if not guild:
-                continue
+            log_channel = self.bot.get_channel(log_channel_id) if log_channel_id else None
+            # Check again in a day if the reminder can't be delivered right now
+            next_reminder_at = now + 86400
 
-            # If no changes have ever been recorded, set the first timestamp and skip this check
-            if not last_change_str:
-                c.execute("UPDATE guild_configs SET last_change_timestamp = ? WHERE guild_id = ?", (now.isoformat(), guild_id))
-                continue
-            
-            last_change_time = datetime.datetime.fromisoformat(last_change_str)
+            if guild and log_channel and group_id and not inactive_since:
+                try:
+                    message = "To ensure your members' roles are up to date, please click the 'Sync WOM Group' button on your clan's settings page in Old School RuneScape. This will refresh your data on Wise Old Man and allow the bot to sync correctly."
+                    await log_channel.send(message)
+                    # Reset the timestamp to now to restart the timer
+                    c.execute("UPDATE guild_configs SET last_change_timestamp = ? WHERE guild_id = ?", (datetime.datetime.now(datetime.timezone.utc).isoformat(), guild_id))
+                    next_reminder_at = now + reminder_days * 86400
+                    logger.info("Sent sync reminder to guild %s (%s).", guild.name, guild.id)
+                except discord.Forbidden:
+                    logger.warning("Could not send reminder to channel %s in guild %s. Missing permissions.", log_channel_id, guild.id)
+                except Exception as e:
+                    logger.error("Failed to send reminder to guild %s: %s", guild.id, e)
 
-            if (now - last_change_time).days >= reminder_days:
-                log_channel = self.bot.get_channel(log_channel_id)
-                if log_channel:
-                    try:
-                        message = "To ensure your members' roles are up to date, please click the 'Sync WOM Group' button on your clan's settings page in Old School RuneScape. This will refresh your data on Wise Old Man and allow the bot to sync correctly."
-                        await log_channel.send(message)
-                        # Reset the timestamp to now to restart the timer
-                        c.execute("UPDATE guild_configs SET last_change_timestamp = ? WHERE guild_id = ?", (now.isoformat(), guild_id))
-                        logger.info(f"Sent sync reminder to guild {guild.name} ({guild.id}).")
-                    except discord.Forbidden:
-                        logger.warning(f"Could not send reminder to channel {log_channel_id} in guild {guild.id}. Missing permissions.")
-                    except Exception as e:
-                        logger.error(f"Failed to send reminder to guild {guild.id}: {e}")
+            c.execute("UPDATE guild_configs SET next_reminder_at = ? WHERE guild_id = ?", (next_reminder_at, guild_id))
+            conn.commit()
 
-        conn.commit()
         conn.close()
-        logger.info("Daily reminder check finished.")
+        if due_guilds:
+            logger.info("Processed %s due sync reminders.", len(due_guilds))
 
     @tasks.loop(hours=24)
     async def backup_database(self):
         await self.bot.wait_until_ready()
         
-        db_file = 'wom_multi.db'
         backup_dir = 'backups'
         
         os.makedirs(backup_dir, exist_ok=True)
@@ -302,10 +1321,10 @@ class TasksCog(commands.Cog):
         backup_file = os.path.join(backup_dir, f'wom_multi_{timestamp}.db')
 
         try:
-            shutil.copy(db_file, backup_file)
-            logger.info(f"Successfully backed up database to {backup_file}")
+            await asyncio.to_thread(backup_database_file, backup_file)
+            logger.info("Successfully backed up database to %s", backup_file)
         except Exception as e:
-            logger.error(f"Failed to back up database: {e}")
+            logger.error("Failed to back up database: %s", e)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(TasksCog(bot))
@@ -0,0 +1,103 @@
+import discord
+from discord import app_commands
+from discord.ext import commands
+import asyncio
+import datetime
+import io
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+logger = logging.getLogger('WOMBot')
+
+LAG_CHECK_INTERVAL = 0.25 # Seconds between event loop heartbeats
+LAG_THRESHOLD = 0.5 # A heartbeat this late counts as a stall and its call site is captured
+MAX_RECORDED_STALLS = 50
+
+class WatchdogCog(commands.Cog):
+    """
+    Measures event loop lag with a heartbeat coroutine. A separate thread watches the heartbeat
+    and, when the loop stalls, captures the stack of whatever is blocking the loop thread.
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.stalls = deque(maxlen=MAX_RECORDED_STALLS)
+        self.stalls_lock = threading.Lock() # Shared by the loop and the watch thread
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.last_heartbeat = time.monotonic()
+        self.loop_thread_id = threading.get_ident()
+        self.running = True
+        self.heartbeat_task = self.bot.loop.create_task(self.heartbeat())
+        self.watch_thread = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+        self.watch_thread.start()
+
+    def cog_unload(self):
+        self.running = False
+        self.heartbeat_task.cancel()
+
+    async def heartbeat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(LAG_CHECK_INTERVAL)
+            now = time.monotonic()
+            lag = now - started - LAG_CHECK_INTERVAL
+            # Fill in the full duration of a stall the watch thread caught while it was happening
+            with self.stalls_lock:
+                stall_ended = bool(self.stalls) and self.stalls[-1]['heartbeat'] == self.last_heartbeat
+                if stall_ended:
+                    self.stalls[-1]['duration'] = lag
+            if stall_ended:
+                logger.warning("Event loop stall ended after %.2fs.", lag)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.last_heartbeat = now
+
+    def watch(self):
+        while self.running:
+            time.sleep(LAG_CHECK_INTERVAL / 2)
+            heartbeat = self.last_heartbeat
+            stalled_for = time.monotonic() - heartbeat - LAG_CHECK_INTERVAL
+            if stalled_for < LAG_THRESHOLD:
+                continue
+            with self.stalls_lock:
+                if self.stalls and self.stalls[-1]['heartbeat'] == heartbeat:
+                    continue
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(stack unavailable)\n"
+            with self.stalls_lock:
+                self.stalls.append({
+                    'heartbeat': heartbeat,
+                    'at': datetime.datetime.now().isoformat(),
+                    'duration': stalled_for,
+                    'stack': stack,
+                })
+            logger.warning("Event loop blocked for over %.2fs. Blocking call site:\n%s", stalled_for, stack)
+
+    def build_report(self) -> str:
+        with self.stalls_lock:
+            stalls = [dict(stall) for stall in self.stalls]
+        lines = [f"Event loop lag report at {datetime.datetime.now().isoformat()}",
+                 f"Last lag: {self.last_lag * 1000:.1f} ms, max lag: {self.max_lag * 1000:.1f} ms, stall threshold: {LAG_THRESHOLD * 1000:.0f} ms",
+                 f"Recorded stalls: {len(stalls)} (most recent last)", ""]
+        for stall in stalls:
+            lines.append(f"--- {stall['at']} blocked for {stall['duration']:.2f}s ---")
+            lines.append(stall['stack'])
+        return "\n".join(lines)
+
+    @app_commands.command(name="looplag", description="Show event loop lag and recent blocking call sites (Developer Only)")
+    async def looplag(self, interaction: discord.Interaction):
+        if interaction.user.id != self.bot.owner_id:
+            return await interaction.response.send_message("Restricted to Bot Developer.", ephemeral=True)
+
+        file = discord.File(io.BytesIO(self.build_report().encode('utf-8')), filename="loop_lag.txt")
+        await interaction.response.send_message(f"⏱️ Last lag: `{self.last_lag * 1000:.1f} ms`\n"
+                                                f"Max lag: `{self.max_lag * 1000:.1f} ms`\n"
+                                                f"Recorded stalls: `{len(self.stalls)}`", file=file, ephemeral=True)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(WatchdogCog(bot))
@@ -4,16 +4,108 @@ from discord.ext import commands
 import sqlite3
 import datetime
 import logging
+import logging.handlers
+import atexit
+import contextvars
+import functools
+import queue
+import random
+import threading
+import urllib.request
 import os
 import sys
 import asyncio
+import signal
+import hashlib
+import json
+import time
 from prompt_toolkit import PromptSession
 from prompt_toolkit.history import InMemoryHistory
 from dotenv import load_dotenv
+from storage import create_storage
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path='config.env')
 
+# --- LOGGING ---
+# Records are put on a queue by the calling thread and written to the console by a background
+# listener thread, so log I/O never blocks the event loop.
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower() # 'json' for structured records, 'text' for plain lines
+LOG_SAMPLE_WINDOW = 60 # Seconds per sampling window for records logged with extra={'sample': True}
+LOG_SAMPLE_LIMIT = 5 # Sampled records allowed per message template per window
+STRUCTURED_LOG_FIELDS = ('guild_id', 'group_id', 'phase')
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in STRUCTURED_LOG_FIELDS:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limits repetitive records flagged with extra={'sample': True}. Each message template gets
+    LOG_SAMPLE_LIMIT records per LOG_SAMPLE_WINDOW seconds; the number dropped is reported once the
+    window rolls over. Runs before formatting, so dropped records cost almost nothing.
+    """
+    def __init__(self):
+        super().__init__()
+        self.windows = {} # (logger, template) -> [window_start, emitted, suppressed]
+
+    def filter(self, record):
+        if not getattr(record, 'sample', False):
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= LOG_SAMPLE_WINDOW:
+            if window and window[2]:
+                record.msg = f"{record.msg} ({window[2]} similar messages suppressed in the last {LOG_SAMPLE_WINDOW}s)"
+            self.windows[key] = [now, 1, 0]
+            return True
+        if window[1] < LOG_SAMPLE_LIMIT:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted so message formatting also happens on the listener thread."""
+    def prepare(self, record):
+        return record
+
+def setup_logging():
+    console_handler = logging.StreamHandler()
+    if LOG_FORMAT == 'text':
+        console_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+    else:
+        console_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers = [queue_handler]
+
+    listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+# Cogs import this module as `main`; only the first import sets up the pipeline
+if not any(isinstance(h, logging.handlers.QueueHandler) for h in logging.getLogger().handlers):
+    setup_logging()
+logger = logging.getLogger('WOMBot')
+
 # --- CONFIGURATION ---
 TOKEN = os.getenv('DISCORD_BOT_TOKEN')
 WOM_API_KEY = os.getenv('WOM_API_KEY')
@@ -35,9 +127,200 @@ else:
         logger.critical("BOT_OWNER_ID must be a valid integer. Exiting.")
         sys.exit(1)
 
-# --- LOGGING ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
-logger = logging.getLogger('WOMBot')
+# --- TRACING ---
+# Guild syncs and command handlers record trees of timed spans. Sampling is decided when a trace's
+# root span starts, so unsampled work only costs a random() call and a context variable lookup.
+# Finished traces are exported from a background thread as JSON lines or OTLP/HTTP JSON.
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE') or 0.05) # Fraction of root spans traced
+TRACE_EXPORTER = (os.getenv('TRACE_EXPORTER') or 'none').lower() # 'none', 'file' or 'otlp'
+TRACE_FILE = os.getenv('TRACE_FILE') or 'traces.jsonl'
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT') or 'http://localhost:4318/v1/traces'
+TRACE_EXPORT_BATCH = 50 # Traces written per export call
+TRACE_INHERITED_ATTRIBUTES = ('guild_id', 'group_id') # Copied from a span to its children
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+class Trace:
+    __slots__ = ('trace_id', 'spans')
+
+    def __init__(self):
+        self.trace_id = random.getrandbits(128)
+        self.spans = []
+
+class Span:
+    sampled = True
+    __slots__ = ('name', 'trace', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'status', 'token')
+
+    def __init__(self, name, trace, parent_id, attributes):
+        self.name = name
+        self.trace = trace
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = 'ok'
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        self.trace.spans.append(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type:
+            self.status = exc_type.__name__
+        current_span.reset(self.token)
+        if self.parent_id is None:
+            export_trace(self.trace)
+        return False
+
+class UnsampledSpan:
+    """Root of an unsampled trace. Marks the task so spans nested under it are skipped too."""
+    sampled = False
+    __slots__ = ('token',)
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current_span.reset(self.token)
+        return False
+
+class NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = NoopSpan()
+
+def trace_span(name, **attributes):
+    """
+    Returns a context manager timing `name` as a child of the current span, or as a new root span
+    when there is none. Spans under an unsampled root are no-ops.
+    """
+    parent = current_span.get()
+    if parent is None:
+        if TRACE_EXPORTER == 'none' or random.random() >= TRACE_SAMPLE_RATE:
+            return UnsampledSpan()
+        return Span(name, Trace(), None, attributes)
+    if not parent.sampled:
+        return NOOP_SPAN
+    inherited = {key: parent.attributes[key] for key in TRACE_INHERITED_ATTRIBUTES if key in parent.attributes}
+    return Span(name, parent.trace, parent.span_id, {**inherited, **attributes})
+
+def traced_command(func):
+    """Runs an app command callback inside a root span named after the command."""
+    @functools.wraps(func)
+    async def wrapper(self, interaction, *args, **kwargs):
+        with trace_span(f"command.{func.__name__}", guild_id=interaction.guild_id, user_id=interaction.user.id):
+            return await func(self, interaction, *args, **kwargs)
+    return wrapper
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class TraceExporter(threading.Thread):
+    def __init__(self):
+        super().__init__(name='trace-exporter', daemon=True)
+        self.queue = queue.SimpleQueue()
+
+    def run(self):
+        while True:
+            traces = [self.queue.get()]
+            while traces[-1] is not None and len(traces) < TRACE_EXPORT_BATCH:
+                try:
+                    traces.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = traces[-1] is None
+            traces = [trace for trace in traces if trace is not None]
+            if traces:
+                try:
+                    if TRACE_EXPORTER == 'otlp':
+                        self.export_otlp(traces)
+                    else:
+                        self.export_file(traces)
+                except Exception as e:
+                    logger.warning("Failed to export %s traces: %s", len(traces), e, extra={'phase': 'tracing', 'sample': True})
+            if stopping:
+                return
+
+    def export_file(self, traces):
+        with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+            for trace in traces:
+                for span in trace.spans:
+                    f.write(json.dumps({
+                        'trace_id': f"{trace.trace_id:032x}",
+                        'span_id': f"{span.span_id:016x}",
+                        'parent_id': f"{span.parent_id:016x}" if span.parent_id else None,
+                        'name': span.name,
+                        'start': datetime.datetime.fromtimestamp(span.start_ns / 1e9, datetime.timezone.utc).isoformat(),
+                        'duration_ms': round((span.end_ns - span.start_ns) / 1e6, 3),
+                        'status': span.status,
+                        'attributes': span.attributes,
+                    }, default=str) + '\n')
+
+    def export_otlp(self, traces):
+        spans = [{
+            'traceId': f"{trace.trace_id:032x}",
+            'spanId': f"{span.span_id:016x}",
+            'parentSpanId': f"{span.parent_id:016x}" if span.parent_id else '',
+            'name': span.name,
+            'kind': 1,
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in span.attributes.items()],
+            'status': {'code': 1} if span.status == 'ok' else {'code': 2, 'message': span.status},
+        } for trace in traces for span in trace.spans]
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'wom-role-sync-bot'}}]},
+            'scopeSpans': [{'scope': {'name': 'WOMBot'}, 'spans': spans}],
+        }]}
+        request = urllib.request.Request(TRACE_OTLP_ENDPOINT, data=json.dumps(payload).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+
+    def stop(self):
+        self.queue.put(None)
+        self.join(timeout=5)
+
+trace_exporter = None
+
+def export_trace(trace):
+    global trace_exporter
+    # Spans still open when the root finishes (e.g. a cancelled child task) are left out
+    trace.spans = [span for span in trace.spans if hasattr(span, 'end_ns')]
+    if trace_exporter is None:
+        trace_exporter = TraceExporter()
+        trace_exporter.start()
+        atexit.register(trace_exporter.stop)
+    trace_exporter.queue.put(trace)
+
+# CLI memprofile reports are written here
+MEMORY_REPORT_DIR = 'memory_reports'
+
+# Seconds to let in-flight guild syncs finish on shutdown. Keep below docker-compose's stop_grace_period.
+SHUTDOWN_DRAIN_TIMEOUT = 25
+
 
 # --- DATABASE SETUP ---
 def init_db():
@@ -51,8 +334,66 @@ def init_db():
     c.execute('''CREATE TABLE IF NOT EXISTS role_mappings
                  (guild_id INTEGER, wom_role TEXT, discord_role_id INTEGER,
                   PRIMARY KEY (guild_id, wom_role))''')
+    # Additional WOM groups for a guild. The primary group stays in guild_configs.group_id and always
+    # has priority 0; lower priority numbers win when a player is in more than one group.
+    c.execute('''CREATE TABLE IF NOT EXISTS guild_groups
+                 (guild_id INTEGER, group_id INTEGER, priority INTEGER,
+                  PRIMARY KEY (guild_id, group_id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_guild_groups_group ON guild_groups (group_id)")
+    # Expired guilds whose links and role mappings still have to be purged from the storage backend
+    c.execute("CREATE TABLE IF NOT EXISTS storage_purge_queue (guild_id INTEGER PRIMARY KEY)")
+    c.execute('''CREATE TABLE IF NOT EXISTS threshold_mappings
+                 (guild_id INTEGER, metric TEXT, min_value REAL, discord_role_id INTEGER,
+                  PRIMARY KEY (guild_id, metric, discord_role_id))''')
     c.execute('''CREATE TABLE IF NOT EXISTS bot_stats
                  (key TEXT PRIMARY KEY, value TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS broadcasts
+                 (broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT, status TEXT, created_at TEXT,
+                  progress_channel_id INTEGER, progress_message_id INTEGER)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS broadcast_deliveries
+                 (broadcast_id INTEGER, channel_id INTEGER, status TEXT, error TEXT,
+                  PRIMARY KEY (broadcast_id, channel_id))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_log_buffer
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER, created_at TEXT, report TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sync_log_buffer_guild ON sync_log_buffer (guild_id, id)")
+    c.execute('''CREATE TABLE IF NOT EXISTS role_events
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT, guild_id INTEGER, discord_id INTEGER, event_type TEXT,
+                  old_value TEXT, new_value TEXT, created_at INTEGER)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_role_events_guild_time ON role_events (guild_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_role_events_member_time ON role_events (guild_id, discord_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_role_events_time ON role_events (created_at)")
+    c.execute('''CREATE TABLE IF NOT EXISTS role_event_daily
+                 (guild_id INTEGER, day TEXT, event_type TEXT, event_count INTEGER,
+                  PRIMARY KEY (guild_id, day, event_type))''')
+    c.execute('''CREATE TABLE IF NOT EXISTS pending_group_events
+                 (group_id INTEGER PRIMARY KEY, first_requested_at REAL, last_requested_at REAL)''')
+    # Per-group summaries written by each sync so the public API never aggregates over live tables
+    # Summaries used to be keyed by group alone, so guilds sharing a group overwrote each other. The
+    # table only caches sync results, so an old one is dropped and refilled by the next sync pass.
+    c.execute("PRAGMA table_info(group_summaries)")
+    summary_columns = [row[1] for row in c.fetchall()]
+    if summary_columns and "guild_id" not in summary_columns:
+        c.execute("DROP TABLE group_summaries")
+    c.execute('''CREATE TABLE IF NOT EXISTS group_summaries
+                 (group_id INTEGER, guild_id INTEGER, last_sync TEXT, member_count INTEGER, linked_count INTEGER,
+                  unresolved_count INTEGER, role_changes INTEGER, name_changes INTEGER, nickname_changes INTEGER,
+                  last_change_at TEXT, updated_at REAL, PRIMARY KEY (group_id, guild_id))''')
+    # Per-player stats. exp/ehp/ehb come free with each group payload; total_level needs a player
+    # lookup, so level_updated_at records which WOM updatedAt the cached total_level belongs to and
+    # level_failed_at when the last lookup failed, so failures are retried later rather than every sync.
+    c.execute('''CREATE TABLE IF NOT EXISTS player_stats
+                 (wom_id INTEGER PRIMARY KEY, updated_at TEXT, exp INTEGER, ehp REAL, ehb REAL,
+                  total_level INTEGER, level_updated_at TEXT, level_failed_at REAL)''')
+    c.execute("PRAGMA table_info(player_stats)")
+    if 'level_failed_at' not in [col[1] for col in c.fetchall()]:
+        c.execute("ALTER TABLE player_stats ADD COLUMN level_failed_at REAL")
+    c.execute('''CREATE TABLE IF NOT EXISTS players
+                 (wom_id INTEGER PRIMARY KEY, username TEXT, normalized_name TEXT, updated_at TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_players_normalized_name ON players (normalized_name)")
+    # players.updated_at is WOM's updatedAt (ISO, ending in Z); clear the local record times older versions stored
+    c.execute("UPDATE players SET updated_at = NULL WHERE updated_at NOT LIKE '%Z'")
+    c.execute('''CREATE TABLE IF NOT EXISTS wom_group_cache
+                 (group_id INTEGER PRIMARY KEY, fetched_at REAL, etag TEXT, updated_at TEXT, memberships BLOB)''')
     
     c.execute("PRAGMA table_info(guild_configs)")
     columns = [col[1] for col in c.fetchall()]
@@ -82,19 +423,52 @@ def init_db():
     columns = [col[1] for col in c.fetchall()]
     if "dm_notifications_on" not in columns:
         c.execute("ALTER TABLE guild_configs ADD COLUMN dm_notifications_on INTEGER DEFAULT 0")
+    if "log_mode" not in columns:
+        c.execute("ALTER TABLE guild_configs ADD COLUMN log_mode TEXT DEFAULT 'immediate'")
+    if "next_reminder_at" not in columns:
+        c.execute("ALTER TABLE guild_configs ADD COLUMN next_reminder_at INTEGER")
+        c.execute("SELECT guild_id, last_change_timestamp, reminder_interval_days FROM guild_configs WHERE reminder_interval_days > 0")
+        c.executemany("UPDATE guild_configs SET next_reminder_at = ? WHERE guild_id = ?",
+                      [(reminder_due_at(last_change, days), guild_id) for guild_id, last_change, days in c.fetchall()])
+    c.execute("CREATE INDEX IF NOT EXISTS idx_guild_configs_next_reminder ON guild_configs (next_reminder_at) WHERE next_reminder_at IS NOT NULL")
 
     c.execute("PRAGMA table_info(links)")
     columns = [col[1] for col in c.fetchall()]
     if "dm_notifications_on" not in columns:
         c.execute("ALTER TABLE links ADD COLUMN dm_notifications_on INTEGER DEFAULT 1")
+    if "wom_role" not in columns:
+        c.execute("ALTER TABLE links ADD COLUMN wom_role TEXT")
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_guild_configs_inactive_since ON guild_configs (inactive_since) WHERE inactive_since IS NOT NULL")
+
+    # Indexes backing the keyset-paginated player list and its filters
+    c.execute("CREATE INDEX IF NOT EXISTS idx_links_guild_rsn ON links (guild_id, rsn COLLATE NOCASE, discord_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_links_guild_wom_id ON links (guild_id, wom_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_links_guild_wom_role ON links (guild_id, wom_role)")
+    # Player renames update links in every guild by wom_id
+    c.execute("CREATE INDEX IF NOT EXISTS idx_links_wom_id ON links (wom_id)")
 
     conn.commit()
+    # WAL lets the web API read while a sync is writing; TasksCog checkpoints it on a schedule
+    c.execute("PRAGMA journal_mode=WAL")
     conn.close()
 
 # --- UTILITY FUNCTIONS ---
 def sanitize_rsn(rsn: str) -> str:
     return ' '.join(rsn.replace('-', ' ').replace('_', ' ').split())
 
+def normalize_rsn(rsn: str) -> str:
+    """Case-folded sanitized RSN, used as the lookup key when matching names to WOM players."""
+    return sanitize_rsn(rsn).casefold()
+
+def reminder_due_at(last_change_timestamp, interval_days):
+    """
+    Epoch seconds when a guild's inactivity reminder is due: interval_days after its last change, or
+    from now if none is recorded. Older timestamps without a UTC offset were written in local time.
+    """
+    start = datetime.datetime.fromisoformat(last_change_timestamp).timestamp() if last_change_timestamp else time.time()
+    return int(start) + interval_days * 86400
+
 # --- BOT DEFINITION ---
 class WOMBot(commands.Bot):
     def __init__(self):
@@ -103,19 +477,31 @@ class WOMBot(commands.Bot):
         intents.message_content = True
         super().__init__(command_prefix="!", intents=intents, owner_id=OWNER_ID)
         self.http_session = None
+        self.storage = None
+        self.start_time = time.monotonic()
+        self.first_ready_logged = False
 
     async def on_ready(self):
-        logger.info(f'Logged in as {self.user.name} ({self.user.id})')
+        logger.info("Logged in as %s (%s)", self.user.name, self.user.id)
+        if not self.first_ready_logged:
+            self.first_ready_logged = True
+            logger.info("Startup timing: first ready after %.2fs", time.monotonic() - self.start_time)
         logger.info('Bot is online and ready!')
         # Only show CLI-related messages if in an interactive terminal
         if sys.stdin.isatty():
             print("------")
             print("Bot is running. Type commands below for maintenance.")
-            print("Available CLI commands: load, unload, reload, stop")
+            print("Available CLI commands: load, unload, reload, synctree [--force], memprofile, stop")
 
     async def close(self):
+        # Let in-flight guild syncs finish so members aren't left half-updated
+        tasks_cog = self.get_cog('TasksCog')
+        if tasks_cog and not tasks_cog.draining:
+            await tasks_cog.drain(SHUTDOWN_DRAIN_TIMEOUT)
         if self.http_session:
             await self.http_session.close()
+        if self.storage:
+            await self.storage.close()
         await super().close()
 
     async def cli_loop(self):
@@ -147,42 +533,99 @@ class WOMBot(commands.Bot):
                     except Exception as e:
                         print(f"❌ Error: {e}")
                 
+                elif action == "synctree":
+                    try:
+                        if await self.sync_command_tree(force="--force" in args[1:]):
+                            print("✅ Command tree synced globally.")
+                        else:
+                            print("✅ Command tree unchanged. Nothing to sync. Use 'synctree --force' to push it anyway.")
+                    except Exception as e:
+                        print(f"❌ Error: {e}")
+
+                elif action == "memprofile" and len(args) > 1:
+                    owner_cog = self.get_cog('OwnerCog')
+                    if not owner_cog:
+                        print("❌ Error: OwnerCog is not loaded.")
+                        continue
+                    report = owner_cog.memory_profile(args[1].lower())
+                    os.makedirs(MEMORY_REPORT_DIR, exist_ok=True)
+                    report_file = os.path.join(MEMORY_REPORT_DIR, f"memory_{args[1].lower()}_{datetime.datetime.now():%Y%m%d_%H%M%S}.txt")
+                    with open(report_file, 'w', encoding='utf-8') as f:
+                        f.write(report)
+                    print(report)
+                    print(f"✅ Report saved to {report_file}")
+
                 elif action in ["stop", "shutdown", "exit"]:
                     print("Shutting down bot...")
                     await self.close()
                     break
                     
                 else:
-                    print(f"Unknown command: '{action}'. Available commands: load, unload, reload, stop")
+                    print(f"Unknown command: '{action}'. Available commands: load, unload, reload, synctree [--force], memprofile, stop")
 
             except (EOFError, KeyboardInterrupt):
                 logger.info("CLI loop interrupted. Shutting down.")
                 await self.close()
                 break
 
+    def get_command_tree_hash(self) -> str:
+        """Returns a stable hash of the serialized global app-command tree."""
+        payload = [cmd.to_dict(self.tree) for cmd in self.tree.get_commands()]
+        payload.sort(key=lambda cmd: (cmd.get('type', 1), cmd['name']))
+        serialized = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    async def sync_command_tree(self, force=False):
+        """Pushes the command tree to Discord if it changed since the last sync, or always when force is set."""
+        tree_hash = self.get_command_tree_hash()
+
+        if not force and await self.storage.get_stat('command_tree_hash') == tree_hash:
+            logger.info("Command tree unchanged. Skipping global sync.")
+            return False
+
+        await self.tree.sync() # Sync globally by default
+        await self.storage.set_stat('command_tree_hash', tree_hash)
+        logger.info("Commands synced globally.")
+        return True
+
     async def setup_hook(self):
+        phase_start = time.monotonic()
         init_db()
+        self.storage = await create_storage()
+        logger.info("Startup timing: database init took %.2fs", time.monotonic() - phase_start)
         self.http_session = aiohttp.ClientSession()
+
+        phase_start = time.monotonic()
         
         # Load api_cog first as it starts the Flask server for the website
         try:
             await self.load_extension(f'cogs.api_cog')
-            logger.info(f"Loaded cog: api_cog")
+            logger.info("Loaded cog: api_cog")
         except Exception as e:
-            logger.error(f"Failed to load cog api_cog: {e}")
+            logger.error("Failed to load cog api_cog: %s", e)
 
         for filename in os.listdir('./cogs'):
             if filename.endswith('.py') and filename != '__init__.py' and filename != 'api_cog.py':
                 try:
                     await self.load_extension(f'cogs.{filename[:-3]}')
-                    logger.info(f"Loaded cog: {filename}")
+                    logger.info("Loaded cog: %s", filename)
                 except Exception as e:
-                    logger.error(f"Failed to load cog {filename}: {e}")
+                    logger.error("Failed to load cog %s: %s", filename, e)
+        logger.info("Startup timing: cog loading took %.2fs", time.monotonic() - phase_start)
 
-        await self.tree.sync() # Sync globally by default
+        phase_start = time.monotonic()
+        try:
+            await self.sync_command_tree()
+        except Exception as e:
+            logger.error("Failed to sync command tree: %s", e)
+        logger.info("Startup timing: command tree sync took %.2fs", time.monotonic() - phase_start)
+
+        # Shut down gracefully on SIGTERM (e.g. docker stop) instead of being killed mid-sync
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: self.loop.create_task(self.close()))
+        except NotImplementedError:
+            pass # Signal handlers aren't supported on Windows event loops
 
-        logger.info("Commands synced globally.")
-        
         # Start the CLI loop as a background task only if in an interactive terminal
         if sys.stdin.isatty():
             self.loop.create_task(self.cli_loop())
@@ -0,0 +1,55 @@
+"""
+Copies links, role mappings and bot stats from wom_multi.db into the PostgreSQL database in
+DATABASE_URL, for switching an existing bot to STORAGE_BACKEND=postgres. Run it once with the
+bot stopped. Rows already in PostgreSQL are overwritten by the SQLite ones, so it is safe to re-run.
+
+Usage: python scripts/import_sqlite_to_postgres.py [path/to/wom_multi.db]
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from storage import PostgresStorage
+
+load_dotenv(dotenv_path='config.env')
+
+# (table, columns, primary key) for every table the storage backend owns
+TABLES = (
+    ('links', ('guild_id', 'discord_id', 'rsn', 'wom_id', 'dm_notifications_on', 'wom_role'), ('guild_id', 'discord_id')),
+    ('role_mappings', ('guild_id', 'wom_role', 'discord_role_id'), ('guild_id', 'wom_role')),
+    ('bot_stats', ('key', 'value'), ('key',)),
+)
+
+async def import_tables(sqlite_path, database_url):
+    storage = PostgresStorage(database_url)
+    await storage.connect() # Creates the tables if needed
+    source = sqlite3.connect(sqlite_path)
+    try:
+        async with storage.pool.acquire() as conn:
+            async with conn.transaction():
+                for table, columns, key in TABLES:
+                    rows = source.execute(f"SELECT {', '.join(columns)} FROM {table}").fetchall()
+                    staging = f"{table}_import"
+                    await conn.execute(f"CREATE TEMP TABLE {staging} (LIKE {table}) ON COMMIT DROP")
+                    await conn.copy_records_to_table(staging, records=rows, columns=columns)
+                    updates = ", ".join(f"{col} = excluded.{col}" for col in columns if col not in key)
+                    await conn.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns)} FROM {staging} "
+                                       f"ON CONFLICT ({', '.join(key)}) DO UPDATE SET {updates}")
+                    print(f"{table}: {len(rows)} rows imported.")
+    finally:
+        source.close()
+        await storage.close()
+
+if __name__ == "__main__":
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("DATABASE_URL is not set in config.env.")
+        sys.exit(1)
+    sqlite_path = sys.argv[1] if len(sys.argv) > 1 else 'wom_multi.db'
+    if not os.path.exists(sqlite_path):
+        print(f"{sqlite_path} does not exist.")
+        sys.exit(1)
+    asyncio.run(import_tables(sqlite_path, database_url))
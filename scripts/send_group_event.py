@@ -0,0 +1,27 @@
+"""
+Sends a "group updated" event to the bot's webhook endpoint, for testing or for use
+from a companion script after clicking "Sync WOM Group" in game.
+
+Usage: python scripts/send_group_event.py <group_id> [url]
+"""
+import os
+import sys
+import requests
+from dotenv import load_dotenv
+
+load_dotenv(dotenv_path='config.env')
+
+if len(sys.argv) < 2:
+    print("Usage: python scripts/send_group_event.py <group_id> [url]")
+    sys.exit(1)
+
+secret = os.getenv('WEBHOOK_SECRET')
+if not secret:
+    print("WEBHOOK_SECRET is not set in config.env.")
+    sys.exit(1)
+
+group_id = int(sys.argv[1])
+url = sys.argv[2] if len(sys.argv) > 2 else "http://localhost:5000/api/webhooks/group-updated"
+
+response = requests.post(url, json={"groupId": group_id}, headers={"Authorization": f"Bearer {secret}"}, timeout=10)
+print(f"{response.status_code}: {response.text}")
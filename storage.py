@@ -0,0 +1,462 @@
+import abc
+import asyncio
+import json
+import os
+import sqlite3
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+# --- STORAGE BACKENDS ---
+# Links, role mappings and bot stats are reached through a Storage object (bot.storage) so they can
+# live in SQLite (default) or PostgreSQL. Everything else (guild configs, groups, history, caches)
+# always stays in wom_multi.db, so the bot still runs on one host either way. The STORAGE_BACKEND
+# environment variable picks the backend; the PostgreSQL backend connects to DATABASE_URL.
+# scripts/import_sqlite_to_postgres.py copies existing SQLite data across when switching.
+POSTGRES_POOL_MIN = 1
+POSTGRES_POOL_MAX = 10
+
+# Link rows are returned as (discord_id, rsn, wom_id, dm_notifications_on, wom_role) tuples.
+LINK_COLUMNS = "discord_id, rsn, wom_id, dm_notifications_on, wom_role"
+
+# Sorts after any character, so [prefix, prefix + PREFIX_UPPER_BOUND) is the range of names starting with prefix
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+class Storage(abc.ABC):
+    """Interface shared by every storage backend. All methods are coroutines."""
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # Links
+    @abc.abstractmethod
+    async def get_links(self, guild_id: int) -> List[tuple]:
+        ...
+
+    @abc.abstractmethod
+    async def get_link(self, guild_id: int, discord_id: int) -> Optional[tuple]:
+        ...
+
+    @abc.abstractmethod
+    async def save_links(self, guild_id: int, links: Iterable[Tuple[int, str, Optional[int]]], replace: bool = True) -> int:
+        """
+        Writes (discord_id, rsn, wom_id) links, each discord_id at most once. Existing links are replaced,
+        resetting their notification preference and WOM role, unless replace is False, in which case they
+        are left alone. Returns the number written.
+        """
+
+    @abc.abstractmethod
+    async def delete_link(self, guild_id: int, discord_id: int) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def set_link_notifications(self, guild_id: int, discord_id: int, enabled: bool) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def apply_link_changes(self, guild_id: int, removed: List[int], updates: List[Tuple[int, str, Optional[int], Optional[str]]]):
+        """Writes a sync's results: deletes the removed discord_ids and sets (discord_id, rsn, wom_id, wom_role) updates."""
+
+    @abc.abstractmethod
+    async def rename_players(self, renames: Dict[int, str]) -> List[tuple]:
+        """
+        Sets the RSN of every link, in every guild, for the given {wom_id: new_rsn}. Links whose RSN
+        already matches (ignoring case) are left alone. Returns (guild_id, discord_id, old_rsn, new_rsn)
+        for each link that changed.
+        """
+
+    @abc.abstractmethod
+    async def count_links(self, guild_id: int, rsn_prefix: Optional[str] = None, unresolved: bool = False, wom_role: Optional[str] = None) -> int:
+        ...
+
+    @abc.abstractmethod
+    async def total_links(self) -> int:
+        """Counts links across every guild."""
+
+    @abc.abstractmethod
+    async def fetch_links_page(self, guild_id: int, after: Optional[tuple] = None, limit: int = 10, **filters) -> List[tuple]:
+        """Returns up to `limit` (discord_id, rsn) rows ordered case-insensitively by RSN, starting after the (rsn, discord_id) key."""
+
+    @abc.abstractmethod
+    def iter_links(self, guild_id: int, batch_size: int = 500, **filters) -> AsyncIterator[List[tuple]]:
+        """
+        Async generator yielding the guild's filtered (discord_id, rsn, wom_id, wom_role) rows in RSN
+        order, batch_size rows at a time.
+        """
+
+    # Role mappings
+    @abc.abstractmethod
+    async def get_role_mappings(self, guild_id: int) -> Dict[str, int]:
+        ...
+
+    @abc.abstractmethod
+    async def set_role_mapping(self, guild_id: int, wom_role: str, discord_role_id: int):
+        ...
+
+    @abc.abstractmethod
+    async def delete_role_mapping(self, guild_id: int, wom_role: str) -> bool:
+        ...
+
+    # Stats
+    @abc.abstractmethod
+    async def get_stat(self, key: str) -> Optional[str]:
+        ...
+
+    @abc.abstractmethod
+    async def set_stat(self, key: str, value: str):
+        ...
+
+    @abc.abstractmethod
+    async def delete_stat(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    async def purge_guilds(self, guild_ids: List[int]):
+        """Deletes the links and role mappings of the given guilds."""
+
+class SqliteStorage(Storage):
+    """SQLite backend. Queries run in a worker thread so large writes don't stall the event loop."""
+    # The current shape of the tables, for a new database file. Existing files are migrated by main.init_db.
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS links
+           (guild_id INTEGER, discord_id INTEGER, rsn TEXT, wom_id INTEGER, dm_notifications_on INTEGER DEFAULT 1, wom_role TEXT,
+            PRIMARY KEY (guild_id, discord_id))''',
+        "CREATE INDEX IF NOT EXISTS idx_links_guild_rsn ON links (guild_id, rsn COLLATE NOCASE, discord_id)",
+        "CREATE INDEX IF NOT EXISTS idx_links_guild_wom_id ON links (guild_id, wom_id)",
+        "CREATE INDEX IF NOT EXISTS idx_links_guild_wom_role ON links (guild_id, wom_role)",
+        "CREATE INDEX IF NOT EXISTS idx_links_wom_id ON links (wom_id)",
+        '''CREATE TABLE IF NOT EXISTS role_mappings
+           (guild_id INTEGER, wom_role TEXT, discord_role_id INTEGER, PRIMARY KEY (guild_id, wom_role))''',
+        "CREATE TABLE IF NOT EXISTS bot_stats (key TEXT PRIMARY KEY, value TEXT)",
+    )
+
+    def __init__(self, path: str = 'wom_multi.db'):
+        self.path = path
+
+    async def connect(self):
+        await asyncio.to_thread(self._run, [(statement, (), False) for statement in self.SCHEMA])
+
+    def _run(self, statements):
+        """Runs (query, params, many) statements in one transaction and returns the last statement's rowcount."""
+        conn = sqlite3.connect(self.path)
+        try:
+            c = conn.cursor()
+            for query, params, many in statements:
+                if many:
+                    c.executemany(query, params)
+                else:
+                    c.execute(query, params)
+            conn.commit()
+            return c.rowcount
+        finally:
+            conn.close()
+
+    async def _execute(self, query, params=(), many=False):
+        return await asyncio.to_thread(self._run, [(query, params, many)])
+
+    def _fetch_rows(self, query, params):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+    async def _fetch(self, query, params=()):
+        return await asyncio.to_thread(self._fetch_rows, query, params)
+
+    def _links_filter(self, guild_id, rsn_prefix=None, unresolved=False, wom_role=None):
+        clauses = ["guild_id = ?"]
+        params = [guild_id]
+        if rsn_prefix:
+            # A range on the NOCASE index; SQLite can't use an index for LIKE with an ESCAPE clause
+            clauses.append("rsn COLLATE NOCASE >= ? AND rsn COLLATE NOCASE < ?")
+            params += [rsn_prefix, rsn_prefix + PREFIX_UPPER_BOUND]
+        if unresolved:
+            clauses.append("wom_id IS NULL")
+        if wom_role:
+            clauses.append("wom_role = ?")
+            params.append(wom_role.lower())
+        return " AND ".join(clauses), params
+
+    async def get_links(self, guild_id):
+        return await self._fetch(f"SELECT {LINK_COLUMNS} FROM links WHERE guild_id = ?", (guild_id,))
+
+    async def get_link(self, guild_id, discord_id):
+        rows = await self._fetch(f"SELECT {LINK_COLUMNS} FROM links WHERE guild_id = ? AND discord_id = ?", (guild_id, discord_id))
+        return rows[0] if rows else None
+
+    async def save_links(self, guild_id, links, replace=True):
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        return await self._execute(f"{verb} INTO links (guild_id, discord_id, rsn, wom_id) VALUES (?, ?, ?, ?)",
+                             [(guild_id, discord_id, rsn, wom_id) for discord_id, rsn, wom_id in links], many=True)
+
+    async def delete_link(self, guild_id, discord_id):
+        return await self._execute("DELETE FROM links WHERE guild_id = ? AND discord_id = ?", (guild_id, discord_id)) > 0
+
+    async def set_link_notifications(self, guild_id, discord_id, enabled):
+        return await self._execute("UPDATE links SET dm_notifications_on = ? WHERE guild_id = ? AND discord_id = ?",
+                             (1 if enabled else 0, guild_id, discord_id)) > 0
+
+    async def apply_link_changes(self, guild_id, removed, updates):
+        await asyncio.to_thread(self._run, [
+            ("DELETE FROM links WHERE guild_id = ? AND discord_id = ?", [(guild_id, discord_id) for discord_id in removed], True),
+            ("UPDATE links SET rsn = ?, wom_id = ?, wom_role = ? WHERE guild_id = ? AND discord_id = ?",
+             [(rsn, wom_id, wom_role, guild_id, discord_id) for discord_id, rsn, wom_id, wom_role in updates], True),
+        ])
+
+    def _rename_players(self, renames):
+        conn = sqlite3.connect(self.path)
+        try:
+            c = conn.cursor()
+            c.execute("SELECT guild_id, discord_id, rsn, wom_id FROM links WHERE wom_id IN (SELECT value FROM json_each(?))",
+                      (json.dumps(list(renames)),))
+            renamed = [(guild_id, discord_id, rsn, renames[wom_id]) for guild_id, discord_id, rsn, wom_id in c.fetchall()
+                       if rsn.lower() != renames[wom_id].lower()]
+            c.executemany("UPDATE links SET rsn = ? WHERE guild_id = ? AND discord_id = ?",
+                          [(new_rsn, guild_id, discord_id) for guild_id, discord_id, _, new_rsn in renamed])
+            conn.commit()
+            return renamed
+        finally:
+            conn.close()
+
+    async def rename_players(self, renames):
+        if not renames:
+            return []
+        return await asyncio.to_thread(self._rename_players, renames)
+
+    async def count_links(self, guild_id, **filters):
+        where, params = self._links_filter(guild_id, **filters)
+        return (await self._fetch(f"SELECT COUNT(*) FROM links WHERE {where}", params))[0][0]
+
+    async def total_links(self):
+        return (await self._fetch("SELECT COUNT(*) FROM links"))[0][0]
+
+    async def fetch_links_page(self, guild_id, after=None, limit=10, **filters):
+        where, params = self._links_filter(guild_id, **filters)
+        if after:
+            where += " AND (rsn COLLATE NOCASE > ? OR (rsn COLLATE NOCASE = ? AND discord_id > ?))"
+            params += [after[0], after[0], after[1]]
+        return await self._fetch(f"SELECT discord_id, rsn FROM links WHERE {where} ORDER BY rsn COLLATE NOCASE, discord_id LIMIT ?", params + [limit])
+
+    async def iter_links(self, guild_id, batch_size=500, **filters):
+        where, params = self._links_filter(guild_id, **filters)
+        # Each batch may be fetched on a different worker thread
+        conn = await asyncio.to_thread(sqlite3.connect, self.path, check_same_thread=False)
+        try:
+            c = conn.cursor()
+            await asyncio.to_thread(c.execute, f"SELECT discord_id, rsn, wom_id, wom_role FROM links WHERE {where} ORDER BY rsn COLLATE NOCASE, discord_id", params)
+            while True:
+                rows = await asyncio.to_thread(c.fetchmany, batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    async def get_role_mappings(self, guild_id):
+        return dict(await self._fetch("SELECT wom_role, discord_role_id FROM role_mappings WHERE guild_id = ?", (guild_id,)))
+
+    async def set_role_mapping(self, guild_id, wom_role, discord_role_id):
+        await self._execute("INSERT OR REPLACE INTO role_mappings (guild_id, wom_role, discord_role_id) VALUES (?, ?, ?)",
+                      (guild_id, wom_role, discord_role_id))
+
+    async def delete_role_mapping(self, guild_id, wom_role):
+        return await self._execute("DELETE FROM role_mappings WHERE guild_id = ? AND wom_role = ?", (guild_id, wom_role)) > 0
+
+    async def get_stat(self, key):
+        rows = await self._fetch("SELECT value FROM bot_stats WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    async def set_stat(self, key, value):
+        await self._execute("INSERT OR REPLACE INTO bot_stats (key, value) VALUES (?, ?)", (key, value))
+
+    async def delete_stat(self, key):
+        await self._execute("DELETE FROM bot_stats WHERE key = ?", (key,))
+
+    async def purge_guilds(self, guild_ids):
+        params = [(guild_id,) for guild_id in guild_ids]
+        await asyncio.to_thread(self._run, [
+            ("DELETE FROM links WHERE guild_id = ?", params, True),
+            ("DELETE FROM role_mappings WHERE guild_id = ?", params, True),
+        ])
+
+class PostgresStorage(Storage):
+    """
+    PostgreSQL backend on an asyncpg connection pool. Bulk link writes go through COPY into a
+    temporary table and sync results through UNNEST arrays, so each costs one round trip.
+    """
+    SCHEMA = (
+        '''CREATE TABLE IF NOT EXISTS links
+           (guild_id BIGINT, discord_id BIGINT, rsn TEXT, wom_id BIGINT, dm_notifications_on INTEGER DEFAULT 1, wom_role TEXT,
+            PRIMARY KEY (guild_id, discord_id))''',
+        "CREATE INDEX IF NOT EXISTS idx_links_guild_rsn ON links (guild_id, lower(rsn), discord_id)",
+        # LIKE prefix matches can only use a pattern_ops index outside the C locale
+        "CREATE INDEX IF NOT EXISTS idx_links_guild_rsn_prefix ON links (guild_id, lower(rsn) text_pattern_ops)",
+        "CREATE INDEX IF NOT EXISTS idx_links_guild_wom_id ON links (guild_id, wom_id)",
+        "CREATE INDEX IF NOT EXISTS idx_links_guild_wom_role ON links (guild_id, wom_role)",
+        "CREATE INDEX IF NOT EXISTS idx_links_wom_id ON links (wom_id)",
+        '''CREATE TABLE IF NOT EXISTS role_mappings
+           (guild_id BIGINT, wom_role TEXT, discord_role_id BIGINT, PRIMARY KEY (guild_id, wom_role))''',
+        "CREATE TABLE IF NOT EXISTS bot_stats (key TEXT PRIMARY KEY, value TEXT)",
+    )
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.pool = None
+
+    async def connect(self):
+        import asyncpg
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=POSTGRES_POOL_MIN, max_size=POSTGRES_POOL_MAX)
+        async with self.pool.acquire() as conn:
+            for statement in self.SCHEMA:
+                await conn.execute(statement)
+
+    async def close(self):
+        if self.pool:
+            await self.pool.close()
+
+    def _links_filter(self, guild_id, rsn_prefix=None, unresolved=False, wom_role=None):
+        clauses = ["guild_id = $1"]
+        params = [guild_id]
+        if rsn_prefix:
+            params.append(f"{escape_like(rsn_prefix.lower())}%")
+            clauses.append(f"lower(rsn) LIKE ${len(params)}")
+        if unresolved:
+            clauses.append("wom_id IS NULL")
+        if wom_role:
+            params.append(wom_role.lower())
+            clauses.append(f"wom_role = ${len(params)}")
+        return " AND ".join(clauses), params
+
+    async def get_links(self, guild_id):
+        return [tuple(row) for row in await self.pool.fetch(f"SELECT {LINK_COLUMNS} FROM links WHERE guild_id = $1", guild_id)]
+
+    async def get_link(self, guild_id, discord_id):
+        row = await self.pool.fetchrow(f"SELECT {LINK_COLUMNS} FROM links WHERE guild_id = $1 AND discord_id = $2", guild_id, discord_id)
+        return tuple(row) if row else None
+
+    async def save_links(self, guild_id, links, replace=True):
+        records = [(discord_id, rsn, wom_id) for discord_id, rsn, wom_id in links]
+        if not records:
+            return 0
+        # A replaced link starts over, matching SQLite's INSERT OR REPLACE
+        conflict = ("DO UPDATE SET rsn = excluded.rsn, wom_id = excluded.wom_id, dm_notifications_on = DEFAULT, wom_role = NULL"
+                    if replace else "DO NOTHING")
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("CREATE TEMP TABLE link_import (discord_id BIGINT, rsn TEXT, wom_id BIGINT) ON COMMIT DROP")
+                await conn.copy_records_to_table('link_import', records=records)
+                status = await conn.execute(f'''INSERT INTO links (guild_id, discord_id, rsn, wom_id)
+                                                SELECT DISTINCT ON (discord_id) $1::BIGINT, discord_id, rsn, wom_id FROM link_import
+                                                ON CONFLICT (guild_id, discord_id) {conflict}''', guild_id)
+        return int(status.split()[-1])
+
+    async def delete_link(self, guild_id, discord_id):
+        status = await self.pool.execute("DELETE FROM links WHERE guild_id = $1 AND discord_id = $2", guild_id, discord_id)
+        return status != "DELETE 0"
+
+    async def set_link_notifications(self, guild_id, discord_id, enabled):
+        status = await self.pool.execute("UPDATE links SET dm_notifications_on = $1 WHERE guild_id = $2 AND discord_id = $3",
+                                         1 if enabled else 0, guild_id, discord_id)
+        return status != "UPDATE 0"
+
+    async def apply_link_changes(self, guild_id, removed, updates):
+        if not removed and not updates:
+            return
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if removed:
+                    await conn.execute("DELETE FROM links WHERE guild_id = $1 AND discord_id = ANY($2::BIGINT[])", guild_id, list(removed))
+                if updates:
+                    discord_ids, rsns, wom_ids, wom_roles = (list(column) for column in zip(*updates))
+                    await conn.execute('''UPDATE links SET rsn = u.rsn, wom_id = u.wom_id, wom_role = u.wom_role
+                                          FROM UNNEST($2::BIGINT[], $3::TEXT[], $4::BIGINT[], $5::TEXT[]) AS u (discord_id, rsn, wom_id, wom_role)
+                                          WHERE links.guild_id = $1 AND links.discord_id = u.discord_id''',
+                                       guild_id, discord_ids, rsns, wom_ids, wom_roles)
+
+    async def rename_players(self, renames):
+        if not renames:
+            return []
+        # The self-join exposes each row's RSN from before the update
+        rows = await self.pool.fetch('''UPDATE links SET rsn = u.rsn FROM UNNEST($1::BIGINT[], $2::TEXT[]) AS u (wom_id, rsn), links AS old
+                                        WHERE links.wom_id = u.wom_id AND lower(links.rsn) <> lower(u.rsn)
+                                            AND old.guild_id = links.guild_id AND old.discord_id = links.discord_id
+                                        RETURNING links.guild_id, links.discord_id, old.rsn, links.rsn''',
+                                     list(renames.keys()), list(renames.values()))
+        return [tuple(row) for row in rows]
+
+    async def count_links(self, guild_id, **filters):
+        where, params = self._links_filter(guild_id, **filters)
+        return await self.pool.fetchval(f"SELECT COUNT(*) FROM links WHERE {where}", *params)
+
+    async def total_links(self):
+        return await self.pool.fetchval("SELECT COUNT(*) FROM links")
+
+    async def fetch_links_page(self, guild_id, after=None, limit=10, **filters):
+        where, params = self._links_filter(guild_id, **filters)
+        if after:
+            params += [after[0].lower(), after[1]]
+            where += f" AND (lower(rsn), discord_id) > (${len(params) - 1}, ${len(params)})"
+        params.append(limit)
+        rows = await self.pool.fetch(f"SELECT discord_id, rsn FROM links WHERE {where} ORDER BY lower(rsn), discord_id LIMIT ${len(params)}", *params)
+        return [tuple(row) for row in rows]
+
+    async def iter_links(self, guild_id, batch_size=500, **filters):
+        where, params = self._links_filter(guild_id, **filters)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(f"SELECT discord_id, rsn, wom_id, wom_role FROM links WHERE {where} ORDER BY lower(rsn), discord_id", *params)
+                while True:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    yield [tuple(row) for row in rows]
+
+    async def get_role_mappings(self, guild_id):
+        return {row['wom_role']: row['discord_role_id'] for row in
+                await self.pool.fetch("SELECT wom_role, discord_role_id FROM role_mappings WHERE guild_id = $1", guild_id)}
+
+    async def set_role_mapping(self, guild_id, wom_role, discord_role_id):
+        await self.pool.execute('''INSERT INTO role_mappings (guild_id, wom_role, discord_role_id) VALUES ($1, $2, $3)
+                                   ON CONFLICT (guild_id, wom_role) DO UPDATE SET discord_role_id = excluded.discord_role_id''',
+                                guild_id, wom_role, discord_role_id)
+
+    async def delete_role_mapping(self, guild_id, wom_role):
+        status = await self.pool.execute("DELETE FROM role_mappings WHERE guild_id = $1 AND wom_role = $2", guild_id, wom_role)
+        return status != "DELETE 0"
+
+    async def get_stat(self, key):
+        return await self.pool.fetchval("SELECT value FROM bot_stats WHERE key = $1", key)
+
+    async def set_stat(self, key, value):
+        await self.pool.execute("INSERT INTO bot_stats (key, value) VALUES ($1, $2) ON CONFLICT (key) DO UPDATE SET value = excluded.value", key, value)
+
+    async def delete_stat(self, key):
+        await self.pool.execute("DELETE FROM bot_stats WHERE key = $1", key)
+
+    async def purge_guilds(self, guild_ids):
+        if not guild_ids:
+            return
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                for table in ('links', 'role_mappings'):
+                    await conn.execute(f"DELETE FROM {table} WHERE guild_id = ANY($1::BIGINT[])", list(guild_ids))
+
+async def create_storage() -> Storage:
+    """Builds and connects the backend selected by STORAGE_BACKEND."""
+    backend = os.getenv('STORAGE_BACKEND') or 'sqlite'
+    if backend == 'postgres':
+        database_url = os.getenv('DATABASE_URL')
+        if not database_url:
+            raise RuntimeError("STORAGE_BACKEND is 'postgres' but DATABASE_URL is not set.")
+        storage = PostgresStorage(database_url)
+    elif backend == 'sqlite':
+        storage = SqliteStorage()
+    else:
+        raise RuntimeError(f"Unknown STORAGE_BACKEND '{backend}'. Use 'sqlite' or 'postgres'.")
+    await storage.connect()
+    return storage
@@ -0,0 +1,25 @@
+import os
+
+# main.py exits at import time without these
+for name in ('DISCORD_BOT_TOKEN', 'WOM_API_KEY', 'BOT_OWNER_ID'):
+    os.environ.setdefault(name, '1')
+
+from cogs.config_cog import parse_bulk_links
+
+def test_parse_bulk_links_delimiters():
+    rows, invalid = parse_bulk_links("discord_id,rsn\n123,Zezima\n<@456>, Lynx_Titan\n")
+    assert rows == [(2, 123, "Zezima"), (3, 456, "Lynx Titan")]
+    assert invalid == []
+
+    rows, _ = parse_bulk_links("123\tZezima\n456\tWoox\n")
+    assert rows == [(1, 123, "Zezima"), (2, 456, "Woox")]
+
+def test_parse_bulk_links_whitespace_separated():
+    rows, invalid = parse_bulk_links("<@123> Zezima\n<@!456>   Lynx Titan\n789 Woox\nnot-a-user Foo\n<@111>\n")
+    assert rows == [(1, 123, "Zezima"), (2, 456, "Lynx Titan"), (3, 789, "Woox")]
+    assert invalid == ["Line 4: `not-a-user` is not a user ID or mention", "Line 5: expected a user and an RSN"]
+
+def test_parse_bulk_links_rejects_long_rsn():
+    rows, invalid = parse_bulk_links("123 ThisNameIsTooLong\n")
+    assert rows == []
+    assert invalid == ["Line 1: `ThisNameIsTooLong` is not a valid RSN"]
@@ -0,0 +1,186 @@
+"""
+Contract tests run against every storage backend. SQLite always runs; PostgreSQL runs when
+TEST_DATABASE_URL points at a throwaway database (its links, role_mappings and bot_stats tables
+are emptied before each test), e.g.
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5432/wombot_test python -m pytest tests
+"""
+import asyncio
+import os
+import pytest
+from storage import PostgresStorage, SqliteStorage
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+class Backend:
+    """A connected storage backend plus the event loop its connections belong to."""
+    def __init__(self, storage):
+        self.storage = storage
+        self.loop = asyncio.new_event_loop()
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def collect(self, batches):
+        async def collect():
+            return [batch async for batch in batches]
+        return self.run(collect())
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        backend = Backend(SqliteStorage(str(tmp_path / 'wom_multi.db')))
+        backend.run(backend.storage.connect())
+    else:
+        if not TEST_DATABASE_URL:
+            pytest.skip("TEST_DATABASE_URL is not set")
+        backend = Backend(PostgresStorage(TEST_DATABASE_URL))
+        backend.run(backend.storage.connect())
+        backend.run(backend.storage.pool.execute("TRUNCATE links, role_mappings, bot_stats"))
+    yield backend
+    backend.run(backend.storage.close())
+    backend.loop.close()
+
+def test_save_and_get_links(backend):
+    storage = backend.storage
+    assert backend.run(storage.save_links(1, [(10, "Zezima", 100), (11, "Lynx Titan", None)])) == 2
+    assert backend.run(storage.save_links(2, [(10, "Other", 200)])) == 1
+
+    assert sorted(backend.run(storage.get_links(1))) == [(10, "Zezima", 100, 1, None), (11, "Lynx Titan", None, 1, None)]
+    assert backend.run(storage.get_link(2, 10)) == (10, "Other", 200, 1, None)
+    assert backend.run(storage.get_link(2, 11)) is None
+    assert backend.run(storage.save_links(1, [])) == 0
+
+def test_save_links_replace_resets_link(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(10, "Zezima", 100)]))
+    backend.run(storage.set_link_notifications(1, 10, False))
+    backend.run(storage.apply_link_changes(1, [], [(10, "Zezima", 100, "owner")]))
+
+    assert backend.run(storage.save_links(1, [(10, "Zezima", 100), (11, "New", None)], replace=False)) == 1
+    assert backend.run(storage.get_link(1, 10)) == (10, "Zezima", 100, 0, "owner")
+
+    assert backend.run(storage.save_links(1, [(10, "Renamed", 101)])) == 1
+    assert backend.run(storage.get_link(1, 10)) == (10, "Renamed", 101, 1, None)
+
+def test_delete_link(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(10, "Zezima", 100)]))
+    assert backend.run(storage.delete_link(1, 10)) is True
+    assert backend.run(storage.delete_link(1, 10)) is False
+    assert backend.run(storage.get_link(1, 10)) is None
+
+def test_set_link_notifications(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(10, "Zezima", 100)]))
+    assert backend.run(storage.set_link_notifications(1, 10, False)) is True
+    assert backend.run(storage.get_link(1, 10))[3] == 0
+    assert backend.run(storage.set_link_notifications(1, 10, True)) is True
+    assert backend.run(storage.get_link(1, 10))[3] == 1
+    assert backend.run(storage.set_link_notifications(1, 99, True)) is False
+
+def test_apply_link_changes(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(10, "Zezima", None), (11, "Lynx Titan", 101), (12, "Gone", 102)]))
+    backend.run(storage.save_links(2, [(12, "Gone", 102)]))
+
+    backend.run(storage.apply_link_changes(1, [12], [(10, "Zezima", 100, "owner"), (11, "Lynx Titan", 101, None)]))
+    assert sorted(backend.run(storage.get_links(1))) == [(10, "Zezima", 100, 1, "owner"), (11, "Lynx Titan", 101, 1, None)]
+    assert backend.run(storage.get_link(2, 12)) == (12, "Gone", 102, 1, None)
+
+    backend.run(storage.apply_link_changes(1, [], []))
+    assert backend.run(storage.count_links(1)) == 2
+
+def test_rename_players_updates_every_guild(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(10, "Old Name", 100), (11, "Keep", 101)]))
+    backend.run(storage.save_links(2, [(20, "Old Name", 100)]))
+
+    backend.run(storage.save_links(3, [(30, "new name", 100)]))
+
+    renamed = backend.run(storage.rename_players({100: "New Name", 101: "Keep"}))
+    assert sorted(renamed) == [(1, 10, "Old Name", "New Name"), (2, 20, "Old Name", "New Name")]
+    assert backend.run(storage.get_link(1, 10))[1] == "New Name"
+    assert backend.run(storage.get_link(2, 20))[1] == "New Name"
+    assert backend.run(storage.get_link(3, 30))[1] == "new name"
+    assert backend.run(storage.get_link(1, 11))[1] == "Keep"
+    assert backend.run(storage.rename_players({})) == []
+
+def test_count_links_filters(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(10, "Bob", 100), (11, "bobby", None), (12, "Alice", 102), (13, "Bo", 103)]))
+    backend.run(storage.save_links(2, [(10, "Bob", 100)]))
+    backend.run(storage.apply_link_changes(1, [], [(10, "Bob", 100, "owner"), (13, "Bo", 103, "owner")]))
+
+    assert backend.run(storage.count_links(1)) == 4
+    assert backend.run(storage.count_links(1, rsn_prefix="bob")) == 2
+    assert backend.run(storage.count_links(1, rsn_prefix="BO")) == 3
+    assert backend.run(storage.count_links(1, unresolved=True)) == 1
+    assert backend.run(storage.count_links(1, wom_role="Owner")) == 2
+    assert backend.run(storage.count_links(1, rsn_prefix="bob", wom_role="owner")) == 1
+    assert backend.run(storage.count_links(3)) == 0
+    assert backend.run(storage.total_links()) == 5
+
+def test_fetch_links_page_orders_case_insensitively(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(14, "dave", None), (10, "Bob", None), (12, "alice", None), (13, "Carol", None), (11, "bob", None)]))
+
+    first = backend.run(storage.fetch_links_page(1, limit=2))
+    assert first == [(12, "alice"), (10, "Bob")]
+    second = backend.run(storage.fetch_links_page(1, after=(first[-1][1], first[-1][0]), limit=2))
+    assert second == [(11, "bob"), (13, "Carol")]
+    third = backend.run(storage.fetch_links_page(1, after=(second[-1][1], second[-1][0]), limit=2))
+    assert third == [(14, "dave")]
+    assert backend.run(storage.fetch_links_page(1, limit=10, rsn_prefix="b")) == [(10, "Bob"), (11, "bob")]
+
+def test_iter_links_batches(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(i, f"Player {i:03d}", i if i % 2 else None) for i in range(25)]))
+
+    batches = backend.collect(storage.iter_links(1, batch_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    rows = [row for batch in batches for row in batch]
+    assert rows[0] == (0, "Player 000", None, None)
+    assert [row[0] for row in rows] == list(range(25))
+
+    unresolved = backend.collect(storage.iter_links(1, unresolved=True))
+    assert [row[0] for batch in unresolved for row in batch] == list(range(0, 25, 2))
+    assert backend.collect(storage.iter_links(2)) == []
+
+def test_role_mappings(backend):
+    storage = backend.storage
+    backend.run(storage.set_role_mapping(1, "owner", 500))
+    backend.run(storage.set_role_mapping(1, "member", 501))
+    backend.run(storage.set_role_mapping(1, "owner", 502))
+    backend.run(storage.set_role_mapping(2, "owner", 600))
+
+    assert backend.run(storage.get_role_mappings(1)) == {"owner": 502, "member": 501}
+    assert backend.run(storage.delete_role_mapping(1, "member")) is True
+    assert backend.run(storage.delete_role_mapping(1, "member")) is False
+    assert backend.run(storage.get_role_mappings(1)) == {"owner": 502}
+    assert backend.run(storage.get_role_mappings(3)) == {}
+
+def test_stats(backend):
+    storage = backend.storage
+    assert backend.run(storage.get_stat("server_count")) is None
+    backend.run(storage.set_stat("server_count", "5"))
+    backend.run(storage.set_stat("server_count", "6"))
+    assert backend.run(storage.get_stat("server_count")) == "6"
+    backend.run(storage.delete_stat("server_count"))
+    assert backend.run(storage.get_stat("server_count")) is None
+
+def test_purge_guilds(backend):
+    storage = backend.storage
+    backend.run(storage.save_links(1, [(10, "Zezima", 100)]))
+    backend.run(storage.save_links(2, [(20, "Lynx Titan", 200)]))
+    backend.run(storage.save_links(3, [(30, "Woox", 300)]))
+    backend.run(storage.set_role_mapping(1, "owner", 500))
+    backend.run(storage.set_role_mapping(3, "owner", 700))
+
+    backend.run(storage.purge_guilds([1, 2]))
+    assert backend.run(storage.get_links(1)) == []
+    assert backend.run(storage.get_links(2)) == []
+    assert backend.run(storage.get_role_mappings(1)) == {}
+    assert backend.run(storage.count_links(3)) == 1
+    assert backend.run(storage.get_role_mappings(3)) == {"owner": 700}
+    backend.run(storage.purge_guilds([]))